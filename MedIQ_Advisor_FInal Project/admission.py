@@ -0,0 +1,213 @@
+import functools
+import math
+import sqlite3
+import threading
+import time
+
+from flask import Response, request, session
+
+import metrics
+
+ADMISSION_TOTAL = metrics.counter("mediq_admission_total", "Admission decisions per limit.", labels=("limit", "outcome"))
+ADMISSION_IN_USE = metrics.gauge("mediq_admission_in_use", "Slots currently held per concurrency cap.", labels=("limit",))
+ADMISSION_CAPACITY = metrics.gauge("mediq_admission_capacity", "Size of each concurrency cap.", labels=("limit",))
+ADMISSION_KEYS = metrics.gauge("mediq_admission_tracked_keys", "Token buckets held in memory.")
+
+
+# ********************************** token bucket stores **********************************
+class StoreBusy(Exception):
+    # the shared bucket store could not be locked in time, the request is neither allowed nor refused
+    pass
+
+
+class MemoryBucketStore(object):
+    # key -> [tokens, last refill time]; full buckets that sat idle are dropped once the table grows
+    def __init__(self, max_keys=50000):
+        self.buckets = {}
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1.0):
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self.buckets[key] = [float(burst), now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= cost:
+                # a negative cost gives tokens back, never above the burst
+                bucket[0] = min(burst, tokens - cost)
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (cost - tokens) / rate
+
+    def _prune(self, now):
+        # buckets idle for an hour are full again and carry no state worth keeping,
+        # under a flood of new keys the older half goes as well
+        for key, (tokens, stamp) in list(self.buckets.items()):
+            if now - stamp > 3600:
+                del self.buckets[key]
+        if len(self.buckets) >= self.max_keys:
+            oldest = sorted(self.buckets.items(), key=lambda item: item[1][1])[:len(self.buckets) // 2]
+            for key, _ in oldest:
+                del self.buckets[key]
+        ADMISSION_KEYS.set(len(self.buckets))
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class SQLiteBucketStore(object):
+    # shared between worker processes of one host, every take is one short write transaction
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        con = self._connection()
+        con.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL) WITHOUT ROWID")
+        con.commit()
+
+    def _connection(self):
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+        return con
+
+    def take(self, key, rate, burst, cost=1.0):
+        # wall clock, because monotonic clocks are not comparable between processes
+        now = time.time()
+        con = self._connection()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            # other workers held the lock for longer than the busy timeout
+            raise StoreBusy(str(e))
+        try:
+            row = con.execute("SELECT tokens, stamp FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = float(burst) if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens = min(burst, tokens - cost)
+            con.execute("INSERT OR REPLACE INTO buckets (key, tokens, stamp) VALUES (?, ?, ?)", (key, tokens, now))
+            con.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            con.execute("ROLLBACK")
+            raise StoreBusy(str(e))
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+# ********************************** concurrency caps **********************************
+class ConcurrencyCap(object):
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.in_use = 0
+        self.lock = threading.Lock()
+        ADMISSION_CAPACITY.set(capacity, limit=name)
+
+    def try_acquire(self):
+        with self.lock:
+            if self.in_use >= self.capacity:
+                ADMISSION_TOTAL.inc(limit=self.name, outcome="rejected")
+                return False
+            self.in_use += 1
+            ADMISSION_IN_USE.set(self.in_use, limit=self.name)
+        ADMISSION_TOTAL.inc(limit=self.name, outcome="allowed")
+        return True
+
+    def release(self):
+        with self.lock:
+            self.in_use -= 1
+            ADMISSION_IN_USE.set(self.in_use, limit=self.name)
+
+
+# ********************************** request keys **********************************
+def client_ip():
+    # the client and not the proxy once factory.create_app trusts MEDIQ_TRUSTED_PROXIES hops of X-Forwarded-For
+    return request.remote_addr or "unknown"
+
+
+def client_key():
+    # signed-in users have their own quota wherever they connect from, visitors are counted per address
+    user_id = session.get('user_id')
+    if user_id is not None:
+        return f"user:{user_id}"
+    return "ip:" + client_ip()
+
+
+def rejection(status, retry_after, message):
+    response = Response(message, status=status, mimetype='text/plain')
+    response.headers['Retry-After'] = str(max(1, int(math.ceil(retry_after))))
+    return response
+
+
+class Limiter(object):
+    def __init__(self, store=None):
+        # an empty store has len() 0, so "store or ..." would throw a shared store away
+        self.store = store if store is not None else MemoryBucketStore()
+
+    def check(self, name, rate, burst, key, cost=1.0):
+        # raises StoreBusy when the shared store is locked, limit() turns that into a 503
+        try:
+            allowed, retry_after = self.store.take(f"{name}:{key}", rate, burst, cost)
+        except StoreBusy:
+            ADMISSION_TOTAL.inc(limit=name, outcome="busy")
+            raise
+        ADMISSION_TOTAL.inc(limit=name, outcome="allowed" if allowed else "rejected")
+        if isinstance(self.store, MemoryBucketStore):
+            ADMISSION_KEYS.set(len(self.store))
+        return allowed, retry_after
+
+    def limit(self, name, per_minute, burst=None, key=client_key, methods=None):
+        # token bucket refilled at per_minute / 60 tokens a second, answers 429 right away when empty
+        rate = per_minute / 60.0
+        burst = burst or per_minute
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if methods is None or request.method in methods:
+                    try:
+                        allowed, retry_after = self.check(name, rate, burst, key())
+                    except StoreBusy:
+                        return rejection(503, 1, 'Server is busy, please try again shortly.')
+                    if not allowed:
+                        return rejection(429, retry_after, 'Too many requests, please try again later.')
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def take(self, name, per_minute, burst, key):
+        # for limits a view charges itself, once it knows the request counts against them
+        return self.check(name, per_minute / 60.0, burst or per_minute, key)
+
+    def refund(self, name, per_minute, burst, key):
+        self.store.take(f"{name}:{key}", per_minute / 60.0, burst or per_minute, cost=-1.0)
+
+    def cap(self, gate, retry_after=5):
+        # concurrency cap for views that return a streaming response, the slot is held until the stream closes
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not gate.try_acquire():
+                    return rejection(503, retry_after, 'Server is busy, please try again shortly.')
+                try:
+                    response = view(*args, **kwargs)
+                except Exception:
+                    gate.release()
+                    raise
+                response.call_on_close(gate.release)
+                return response
+            return wrapper
+        return decorator
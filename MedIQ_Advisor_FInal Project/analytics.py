@@ -0,0 +1,261 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+import screening
+
+# Survey answers kept as one memory-mapped array of category codes per column. The cache is built
+# from survey.csv once and rebuilt only when the file's content hash changes, requests never parse
+# the csv text.
+
+CACHE_DIR = 'instance/survey_cache'
+CACHE_VERSION = 2
+
+# free text and timestamps are not aggregated
+SKIPPED_COLUMNS = ('Timestamp', 'comments')
+NUMERIC_COLUMNS = ('Age',)
+
+# answers with a natural order, everything else is listed alphabetically
+ORDERED_ANSWERS = {
+    'no_employees': ['1-5', '6-25', '26-100', '100-500', '500-1000', 'More than 1000'],
+    'work_interfere': ['Never', 'Rarely', 'Sometimes', 'Often', 'N/A'],
+    'leave': ["Don't know", 'Very easy', 'Somewhat easy', 'Somewhat difficult', 'Very difficult'],
+}
+
+# limits of one query, every extra group-by column multiplies the groups
+MAX_GROUP_COLUMNS = 3
+MAX_GROUPS = 10000
+# up to this many possible combinations one bincount is cheapest, above it only the ones present are counted
+DENSE_GROUPS = 1 << 16
+
+AGE_BANDS = (18, 25, 30, 35, 40, 50, 61)
+AGE_BAND_LABELS = [f"{low}-{high - 1}" for low, high in zip(AGE_BANDS, AGE_BANDS[1:])]
+
+ANALYTICS_QUERY_SECONDS = metrics.histogram("mediq_analytics_query_seconds", "Survey aggregate computation, cache misses only.")
+ANALYTICS_QUERIES = metrics.counter("mediq_analytics_queries_total", "Survey aggregate requests.", labels=("result",))
+ANALYTICS_BUILD_SECONDS = metrics.gauge("mediq_analytics_build_seconds", "Time the last columnar cache build took.")
+
+
+class QueryError(ValueError):
+    pass
+
+
+def file_digest(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ********************************** cache build **********************************
+def _code_dtype(size):
+    return np.uint8 if size <= 255 else np.uint16 if size <= 65535 else np.uint32
+
+
+def build_cache(csv_path, directory):
+    # One pass over the csv with the notebook's cleaning rules. Codes are handed out in the order
+    # values are first seen and remapped to the sorted category order at the end.
+    started = time.perf_counter()
+    with open(csv_path, 'r', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        columns = [name for name in reader.fieldnames if name not in SKIPPED_COLUMNS]
+        seen = {name: {} for name in columns if name not in NUMERIC_COLUMNS}
+        values = {name: [] for name in columns}
+        for row in reader:
+            row = screening.clean_row(row)
+            if row is None:
+                continue
+            for name in columns:
+                if name in NUMERIC_COLUMNS:
+                    values[name].append(row[name])
+                else:
+                    codes = seen[name]
+                    values[name].append(codes.setdefault(row[name], len(codes)))
+
+    # built next to its final place under a name of its own, workers building at the same time do not meet
+    temporary = tempfile.mkdtemp(prefix='.build-', dir=os.path.dirname(directory))
+    categories = {}
+    for name in columns:
+        if name in NUMERIC_COLUMNS:
+            array = np.array(values[name], dtype=np.int16)
+        else:
+            first_seen = list(seen[name])
+            categories[name] = sorted(first_seen)
+            remap = np.array([categories[name].index(value) for value in first_seen], dtype=np.int64)
+            array = remap[np.array(values[name], dtype=np.int64)].astype(_code_dtype(len(first_seen)))
+        np.save(os.path.join(temporary, name + '.npy'), array)
+        values[name] = None
+        if name == 'Age':
+            # age bands are a column of their own so they group like any other answer
+            bands = (np.searchsorted(AGE_BANDS, array, side='right') - 1).astype(np.uint8)
+            np.save(os.path.join(temporary, 'age_band.npy'), bands)
+            categories['age_band'] = AGE_BAND_LABELS
+
+    columns.append('age_band')
+
+    manifest = {'version': CACHE_VERSION, 'rows': len(array), 'columns': columns, 'categories': categories}
+    with open(os.path.join(temporary, 'manifest.json'), 'w') as out:
+        json.dump(manifest, out)
+    try:
+        os.replace(temporary, directory)
+    except OSError:
+        # another worker finished the same build first, its copy is as good as this one
+        shutil.rmtree(temporary, ignore_errors=True)
+        if not os.path.exists(os.path.join(directory, 'manifest.json')):
+            raise
+    ANALYTICS_BUILD_SECONDS.set(round(time.perf_counter() - started, 3))
+
+
+# ********************************** columnar store **********************************
+class SurveyStore(object):
+    def __init__(self, csv_path=screening.SURVEY_PATH, cache_dir=CACHE_DIR, memo_size=512):
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir
+        self.memo_size = memo_size
+        self.lock = threading.Lock()
+        self.stat = None
+        self.digest = None
+        self.memo = OrderedDict()
+        self._load()
+
+    def _load(self):
+        stat = os.stat(self.csv_path)
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.digest = file_digest(self.csv_path)
+        # the directory name carries the cache version, a complete manifest means a complete cache
+        name = f"{self.digest[:16]}-v{CACHE_VERSION}"
+        directory = os.path.join(self.cache_dir, name)
+        manifest_path = os.path.join(directory, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            build_cache(self.csv_path, directory)
+            # caches of older versions of the csv are of no use any more, builds still running are left alone
+            for entry in os.listdir(self.cache_dir):
+                if entry != name and not entry.startswith('.'):
+                    shutil.rmtree(os.path.join(self.cache_dir, entry), ignore_errors=True)
+        with open(manifest_path) as saved:
+            manifest = json.load(saved)
+
+        self.rows = manifest['rows']
+        self.categories = manifest['categories']
+        self.columns = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in manifest['columns']}
+        self.memo.clear()
+
+    def refresh(self):
+        # a stat per call, the file is only hashed again when its size or mtime moved
+        stat = os.stat(self.csv_path)
+        if (stat.st_size, stat.st_mtime_ns) == self.stat:
+            return
+        with self.lock:
+            if (stat.st_size, stat.st_mtime_ns) != self.stat:
+                if file_digest(self.csv_path) == self.digest:
+                    self.stat = (stat.st_size, stat.st_mtime_ns)
+                else:
+                    self._load()
+
+    # ********************************** queries **********************************
+    def _mask(self, where):
+        mask = None
+        for name, wanted in where:
+            if name not in self.categories:
+                raise QueryError(f"unknown column {name}")
+            unknown = [value for value in wanted if value not in self.categories[name]]
+            if unknown:
+                raise QueryError(f"unknown answer {name}={unknown[0]}")
+            codes = [self.categories[name].index(value) for value in wanted]
+            selected = np.isin(self.columns[name], codes)
+            mask = selected if mask is None else mask & selected
+        return mask
+
+    def rate(self, by, target='treatment', value='Yes', where=()):
+        # share of respondents answering target=value per group, by is a list of columns
+        key = (tuple(by), target, value, tuple((name, tuple(wanted)) for name, wanted in where))
+        self.refresh()
+        with self.lock:
+            result = self.memo.get(key)
+            if result is not None:
+                self.memo.move_to_end(key)
+        if result is not None:
+            ANALYTICS_QUERIES.inc(result="hit")
+            return result
+
+        ANALYTICS_QUERIES.inc(result="miss")
+        with ANALYTICS_QUERY_SECONDS.time():
+            result = self._rate(key[0], target, value, self._mask(where))
+        with self.lock:
+            self.memo[key] = result
+            if len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+        return result
+
+    def _rate(self, by, target, value, mask):
+        if not by:
+            raise QueryError("at least one group-by column is needed")
+        if len(set(by)) != len(by):
+            raise QueryError("a group-by column is given twice")
+        if len(by) > MAX_GROUP_COLUMNS:
+            raise QueryError(f"at most {MAX_GROUP_COLUMNS} group-by columns")
+        if target not in self.categories or value not in self.categories[target]:
+            raise QueryError(f"unknown answer {target}={value}")
+
+        # the group-by columns are folded into one int64 code, at most 3 columns of uint16 codes cannot overflow it
+        group = None
+        sizes = []
+        for name in by:
+            if name not in self.categories:
+                raise QueryError(f"unknown column {name}")
+            codes, size = self.columns[name], len(self.categories[name])
+            group = codes.astype(np.int64) if group is None else group * size + codes
+            sizes.append(size)
+        hit = self.columns[target] == self.categories[target].index(value)
+        if mask is not None:
+            group, hit = group[mask], hit[mask]
+
+        combinations = int(np.prod(sizes, dtype=object))
+        if combinations <= DENSE_GROUPS:
+            # group and answer in one bincount over every possible combination
+            counts = np.bincount(group * 2 + hit, minlength=2 * combinations).reshape(combinations, 2)
+            present = np.flatnonzero(counts.sum(axis=1))
+            counts = counts[present]
+        else:
+            # only the combinations that occur, however many there could be
+            present, inverse = np.unique(group, return_inverse=True)
+            counts = np.bincount(inverse * 2 + hit, minlength=2 * len(present)).reshape(len(present), 2)
+        if len(present) > MAX_GROUPS:
+            raise QueryError(f"more than {MAX_GROUPS} groups, group by fewer columns or filter first")
+
+        labels = []
+        for code in present.tolist():
+            label = []
+            for name, size in zip(reversed(by), reversed(sizes)):
+                code, index = divmod(code, size)
+                label.append(self.categories[name][index])
+            labels.append(tuple(reversed(label)))
+        totals = counts.sum(axis=1)
+        hits = counts[:, 1]
+
+        groups = []
+        for index in self._order(by, labels):
+            groups.append({'group': dict(zip(by, labels[index])), 'respondents': int(totals[index]),
+                           'count': int(hits[index]), 'rate': round(float(hits[index] / totals[index]), 4)})
+        return {'by': list(by), 'target': target, 'value': value, 'respondents': int(totals.sum()), 'groups': groups}
+
+    def _order(self, by, labels):
+        # natural answer order where there is one, so buckets like no_employees read small to large
+        def rank(name, label):
+            order = ORDERED_ANSWERS.get(name)
+            return (order.index(label), '') if order and label in order else (len(order or ()), label)
+        return sorted(range(len(labels)), key=lambda index: [rank(name, label) for name, label in zip(by, labels[index])])
+
+    def describe(self):
+        return {'rows': self.rows, 'digest': self.digest, 'columns': self.categories}
@@ -0,0 +1,282 @@
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import time
+
+from flask import Blueprint, current_app, request, send_from_directory
+from markupsafe import Markup, escape
+
+# Build-time asset pipeline, the app only reads the manifest it writes.
+#
+#   python assets.py build        resized WebP/AVIF image variants, minified stylesheets, gzip/brotli copies
+#   python assets.py clean
+#
+# Every built file carries a content hash in its name and is served from /static/dist with a one year
+# immutable Cache-Control; when a client accepts it the .br or .gz copy is sent as is. Templates ask for
+# assets through asset() and responsive_image(), which fall back to the plain /static files as long as
+# nothing was built.
+
+STATIC_DIR = 'static'
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST = os.path.join(DIST_DIR, 'manifest.json')
+
+# widths of the image variants, none wider than the original
+IMAGE_WIDTHS = (160, 320, 640, 1280, 1920)
+IMAGES = ('images/Harshal.jpeg', 'images/arya.jpg', 'images/banner.jpg', 'images/faizan.jpg',
+          'images/himanshu.jpg', 'images/logo.png')
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+JPEG_QUALITY = 82
+
+# every page loads one of these next to its CDN stylesheets, there is nothing to concatenate
+STYLESHEETS = ('css/style.css', 'css/sign_in_sign_up.css')
+SCRIPTS = ('js/chatbot.js',)
+
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg')
+ONE_YEAR = 365 * 24 * 3600
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def fingerprinted(path, data):
+    # images/faizan-320.webp -> images/faizan-320.3f2a9c01de.webp
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{content_hash(data)}{extension}"
+
+
+# ********************************** build **********************************
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    # only the space after a colon goes, "a :hover" and "a:hover" are different selectors
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+def build_css(path, urls):
+    with open(os.path.join(STATIC_DIR, path), encoding='utf-8') as source:
+        css = minify_css(source.read())
+
+    # url(/static/...) of files that were built point at their fingerprinted copy
+    def rewrite(match):
+        target = match.group(2)
+        if target.startswith('/static/') and target[len('/static/'):] in urls:
+            return f'url({urls[target[len("/static/"):]]})'
+        return match.group(0)
+    return re.sub(r'url\((["\']?)([^)"\']+)\1\)', rewrite, css)
+
+
+def _write(relative, data):
+    path = os.path.join(DIST_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as out:
+        out.write(data)
+
+
+def _precompress(relative, data, stats):
+    # mtime=0 keeps the .gz byte identical between builds
+    _write(relative + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    stats['gzip'] += 1
+    try:
+        import brotli
+    except ImportError:
+        return
+    _write(relative + '.br', brotli.compress(data, quality=11))
+    stats['brotli'] += 1
+
+
+def build_images(manifest):
+    import cv2
+    import numpy as np
+
+    formats = [('webp', [cv2.IMWRITE_WEBP_QUALITY, WEBP_QUALITY])]
+    if cv2.haveImageWriter('.avif'):
+        formats.insert(0, ('avif', [cv2.IMWRITE_AVIF_QUALITY, AVIF_QUALITY]))
+    else:
+        print("this opencv build has no AVIF encoder, only WebP variants are made")
+
+    for path in IMAGES:
+        with open(os.path.join(STATIC_DIR, path), 'rb') as source:
+            original = source.read()
+        image = cv2.imdecode(np.frombuffer(original, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if image is None:
+            print(f"skipping {path}: not readable")
+            continue
+        height, width = image.shape[:2]
+        stem, extension = os.path.splitext(path)
+        fallback_format = 'png' if image.ndim == 3 and image.shape[2] == 4 else 'jpg'
+        if fallback_format == 'png':
+            fallback_params = [cv2.IMWRITE_PNG_COMPRESSION, 9]
+        else:
+            fallback_params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY, cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+        widths = [w for w in IMAGE_WIDTHS if w < width] + [width]
+
+        entry = {'width': width, 'height': height, 'variants': {}}
+        for target_width in widths:
+            if target_width == width:
+                resized = image
+            else:
+                resized = cv2.resize(image, (target_width, round(height * target_width / width)), interpolation=cv2.INTER_AREA)
+            for name, params in formats + [(fallback_format, fallback_params)]:
+                ok, encoded = cv2.imencode('.' + name, resized, params)
+                if not ok:
+                    continue
+                data = encoded.tobytes()
+                if target_width == width and name == fallback_format and len(original) < len(data):
+                    # re-encoding the full size fallback made it bigger, the original file is used instead
+                    data = original
+                relative = fingerprinted(f"{stem}-{target_width}.{name}", data)
+                _write(relative, data)
+                entry['variants'].setdefault(name, []).append([target_width, relative, len(data)])
+        entry['fallback'] = fallback_format
+        manifest['images'][path] = entry
+        # plain references (css backgrounds) get the full width fallback
+        manifest['files'][path] = entry['variants'][fallback_format][-1][1]
+
+
+def build(verbose=True):
+    started = time.perf_counter()
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    os.makedirs(DIST_DIR)
+    manifest = {'version': 1, 'built': time.strftime('%Y-%m-%dT%H:%M:%S'), 'files': {}, 'images': {}, 'sizes': {}}
+    stats = {'gzip': 0, 'brotli': 0}
+
+    build_images(manifest)
+    urls = {path: '/static/dist/' + relative for path, relative in manifest['files'].items()}
+
+    text_assets = {}
+    for path in STYLESHEETS:
+        text_assets[path] = build_css(path, urls).encode('utf-8')
+    for path in SCRIPTS:
+        with open(os.path.join(STATIC_DIR, path), 'rb') as source:
+            text_assets[path] = source.read()
+
+    for path, data in text_assets.items():
+        relative = fingerprinted(path, data)
+        _write(relative, data)
+        if relative.endswith(COMPRESSIBLE):
+            _precompress(relative, data, stats)
+        manifest['files'][path] = relative
+        manifest['sizes'][path] = len(data)
+
+    with open(MANIFEST, 'w') as out:
+        json.dump(manifest, out, indent=1)
+    if verbose:
+        total = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(DIST_DIR) for name in names)
+        print(f"built {len(manifest['images'])} images, {len(STYLESHEETS)} stylesheets, {len(SCRIPTS)} scripts, "
+              f"{stats['gzip']} .gz and {stats['brotli']} .br copies, {total / 1024:.0f} KiB in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+# ********************************** template helpers **********************************
+class Assets(object):
+    def __init__(self, app):
+        self.app = app
+        self.path = os.path.join(app.root_path, MANIFEST)
+        self.manifest = None
+        self.mtime = None
+
+    def current(self):
+        # the manifest is read again after a rebuild, without a build every lookup falls back to /static
+        if not self.app.config.get('MEDIQ_ASSETS', True):
+            return None
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self.mtime:
+            with open(self.path) as saved:
+                self.manifest = json.load(saved)
+            self.mtime = mtime
+        return self.manifest
+
+    def url(self, path):
+        manifest = self.current()
+        if manifest is not None and path in manifest['files']:
+            return '/static/dist/' + manifest['files'][path]
+        return '/static/' + path
+
+    def image(self, path, alt='', sizes='100vw', width=None, lazy=True, **attributes):
+        # <picture> with AVIF/WebP sources and a srcset on the fallback <img>, sizes tells the browser
+        # how wide the image is drawn so it can pick the smallest variant that is sharp enough
+        manifest = self.current()
+        entry = manifest['images'].get(path) if manifest is not None else None
+        extra = ''.join(f' {name.replace("_", "-")}="{escape(value)}"' for name, value in attributes.items())
+        loading = ' loading="lazy" decoding="async"' if lazy else ''
+        if entry is None:
+            return Markup(f'<img src="/static/{escape(path)}" alt="{escape(alt)}"{loading}{extra}>')
+
+        def srcset(name):
+            return ', '.join(f'/static/dist/{relative} {variant_width}w' for variant_width, relative, _ in entry['variants'][name])
+
+        fallback = entry['variants'][entry['fallback']]
+        # src for browsers without srcset support: the smallest variant at least as wide as the layout width
+        src = next((relative for variant_width, relative, _ in fallback if width and variant_width >= width), fallback[-1][1])
+        sources = ''.join(f'<source type="image/{name}" srcset="{srcset(name)}" sizes="{escape(sizes)}">'
+                          for name in ('avif', 'webp') if name in entry['variants'])
+        dimensions = f' width="{entry["width"]}" height="{entry["height"]}"'
+        return Markup(f'<picture>{sources}<img src="/static/dist/{src}" srcset="{srcset(entry["fallback"])}" '
+                      f'sizes="{escape(sizes)}"{dimensions} alt="{escape(alt)}"{loading}{extra}></picture>')
+
+
+# ********************************** serving **********************************
+bp = Blueprint('assets', __name__)
+
+
+@bp.route('/static/dist/<path:filename>')
+def dist(filename):
+    # fingerprinted files never change, precompressed copies are sent when the client takes them
+    directory = os.path.join(current_app.root_path, DIST_DIR)
+    accepted = request.accept_encodings
+    encoding = None
+    if filename.endswith(COMPRESSIBLE):
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[candidate] and os.path.exists(os.path.join(directory, filename + suffix)):
+                encoding = candidate
+                break
+
+    if encoding is None:
+        response = send_from_directory(directory, filename, max_age=ONE_YEAR)
+    else:
+        response = send_from_directory(directory, filename + ('.br' if encoding == 'br' else '.gz'), max_age=ONE_YEAR,
+                                       mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['Content-Encoding'] = encoding
+    if filename.endswith(COMPRESSIBLE):
+        response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    response.cache_control.public = True
+    return response
+
+
+def init_app(app):
+    assets = Assets(app)
+    app.extensions['mediq_assets'] = assets
+    app.jinja_env.globals.update(asset=assets.url, responsive_image=assets.image)
+    app.register_blueprint(bp)
+    # files outside /static/dist keep their names, an hour of caching with revalidation after that
+    if app.config.get('SEND_FILE_MAX_AGE_DEFAULT') is None:
+        app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 3600
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MedIQ Advisor static asset pipeline")
+    parser.add_argument('command', choices=('build', 'clean'))
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.command == 'build':
+        build()
+    else:
+        shutil.rmtree(DIST_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,615 @@
+import argparse
+import gzip
+import json
+import os
+import platform
+import shutil
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from html.parser import HTMLParser
+
+# Offline benchmark of the app's hot paths, runs on CPU without a webcam or a real mail server.
+#
+#   python bench.py --output bench.json                    run everything and save the results
+#   python bench.py --baseline bench.json                  run again and compare against saved results
+#   python bench.py --video session.mp4 --only emotion_frame
+#   MEDIQ_INFERENCE_WORKERS=4 python bench.py --only home_under_load --streams 4
+#   python bench.py --only survey_analytics --survey-scale 1000
+#   python bench.py --only role_startup                     startup time and memory of the web, ml and all roles
+#   python assets.py build && python bench.py --only page_weight
+#   python bench.py --only history --history-events 1000000
+#
+# The comparison exits with status 1 when any p50/p99 got slower than the baseline by more than --threshold.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ********************************** local SMTP stub **********************************
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line + b"\r\n")
+
+    def handle(self):
+        self.reply(b"220 localhost MedIQ bench SMTP stub")
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    self.server.messages += 1
+                    self.reply(b"250 OK")
+                continue
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.reply(b"250-localhost")
+                self.reply(b"250 AUTH PLAIN LOGIN")
+            elif command == b"AUTH":
+                self.reply(b"235 2.7.0 Authentication successful")
+            elif command == b"DATA":
+                in_data = True
+                self.reply(b"354 End data with <CR><LF>.<CR><LF>")
+            elif command == b"QUIT":
+                self.reply(b"221 Bye")
+                return
+            else:
+                self.reply(b"250 OK")
+
+
+def start_smtp_stub():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPStubHandler)
+    server.daemon_threads = True
+    server.messages = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ********************************** helpers **********************************
+def summarize(samples):
+    # samples are seconds per operation
+    ordered = sorted(samples)
+    n = len(ordered)
+    total = sum(ordered)
+    return {
+        "n": n,
+        "mean_ms": round(total / n * 1000, 3),
+        "p50_ms": round(ordered[n // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(n - 1, int(n * 0.95))] * 1000, 3),
+        "p99_ms": round(ordered[min(n - 1, int(n * 0.99))] * 1000, 3),
+        "ops_per_s": round(n / total, 1) if total else 0.0,
+    }
+
+
+def measure(operation, iterations, warmup=3):
+    for _ in range(warmup):
+        operation()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+class FrameSource(object):
+    # stands in for cv2.VideoCapture(0) inside VideoCamera
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = 0
+
+    def read(self):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        return True, frame.copy()
+
+    def release(self):
+        pass
+
+
+def fake_camera(frames):
+    # VideoCamera without opening a webcam
+    import collections
+    from views import emotion
+
+    camera = emotion.VideoCamera.__new__(emotion.VideoCamera)
+    camera.video = FrameSource(frames)
+    camera.frames, camera.emotions = 0, collections.Counter()
+    return camera
+
+
+def load_frames(video, count=60):
+    import cv2
+    import numpy as np
+
+    if video:
+        capture = cv2.VideoCapture(video)
+        frames = []
+        while len(frames) < count:
+            success, frame = capture.read()
+            if not success:
+                break
+            frames.append(frame)
+        capture.release()
+        if frames:
+            return frames
+
+    # synthetic 640x480 frames: noise plus a bright ellipse so the cascade has something to scan
+    rng = np.random.default_rng(7)
+    frames = []
+    for i in range(count):
+        frame = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        cv2.ellipse(frame, (320 + i % 40, 240), (90, 120), 0, 0, 360, (200, 180, 160), -1)
+        frames.append(frame)
+    return frames
+
+
+# ********************************** benchmarks **********************************
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(function):
+        BENCHMARKS[name] = function
+        return function
+    return decorator
+
+
+@benchmark("emotion_frame")
+def bench_emotion_frame(app, args):
+    # Haar detection + emotion inference + jpeg encode for one frame, exactly as /video_feed_emotion does
+    camera = fake_camera(load_frames(args.video))
+
+    def operation():
+        camera.start_time = time.time()
+        camera.get_frame()
+
+    return measure(operation, args.iterations)
+
+
+@benchmark("emotion_predict")
+def bench_emotion_predict(app, args):
+    import numpy as np
+    from views import emotion
+
+    roi = np.random.default_rng(7).random((1, 48, 48, 1))
+    return measure(lambda: emotion.classifier.predict(roi, verbose=0), args.iterations)
+
+
+@benchmark("mjpeg_encode")
+def bench_mjpeg_encode(app, args):
+    import cv2
+
+    frames = load_frames(args.video)
+    sizes = []
+    state = {"index": 0}
+
+    def operation():
+        frame = frames[state["index"] % len(frames)]
+        state["index"] += 1
+        ret, jpeg = cv2.imencode('.jpg', frame)
+        part = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n\r\n'
+        sizes.append(len(part))
+
+    result = measure(operation, args.iterations)
+    result["mb_per_s"] = round(sum(sizes) / len(sizes) * result["ops_per_s"] / 1e6, 2)
+    return result
+
+
+@benchmark("auth_roundtrip")
+def bench_auth_roundtrip(app, args):
+    client = app.test_client()
+    counter = {"n": 0}
+    password = "Bench@1234"
+
+    def user():
+        return f"bench_{os.getpid()}_{counter['n']:06d}"
+
+    def signup():
+        counter["n"] += 1
+        client.post('/signup', data={
+            'fullName': 'Bench User', 'gender': 'male', 'age': '30', 'username': user(),
+            'email': f"{user()}@gmail.com", 'mobile_no': '9876543210', 'city': 'Pune',
+            'emergency_contact': '9876543211', 'concern': '', 'password': password})
+
+    def signin():
+        client.post('/signin', data={'username': user(), 'password': password})
+
+    def forgot_password():
+        # a different signed up user and client address every time, so the
+        # per-user and per-ip admission limits of /forgotpassword do not kick in
+        counter["reset"] += 1
+        name = f"bench_{os.getpid()}_{counter['reset']:06d}"
+        client.post('/forgotpassword', data={'username': name, 'email': f"{name}@gmail.com", 'password': password},
+                    environ_base={'REMOTE_ADDR': f"10.0.{counter['reset'] // 256 % 256}.{counter['reset'] % 256}"})
+
+    results = {"signup": measure(signup, args.iterations), "signin": measure(signin, args.iterations)}
+    counter["reset"] = 0
+    results["forgot_password"] = measure(forgot_password, max(1, args.iterations // 4))
+    return results
+
+
+@benchmark("screening_score")
+def bench_screening_score(app, args):
+    import screening
+    from views import screening as screening_views
+
+    rows = screening.load_survey()
+    categories = screening.fit_categories(rows)
+    features = screening.encode(rows, categories)
+    state = {"index": 0}
+
+    def single_row():
+        i = state["index"] % len(rows)
+        state["index"] += 1
+        screening.screening_scores(screening_views.loaded_model, screening.encode(rows[i:i + 1], categories))
+
+    batch = measure(lambda: screening.screening_scores(screening_views.loaded_model, features), max(5, args.iterations // 10), warmup=1)
+    batch["rows_per_s"] = round(len(rows) * 1000 / batch["mean_ms"], 1)
+    return {"single_row": measure(single_row, args.iterations), "full_survey": batch}
+
+
+@benchmark("questionnaire")
+def bench_questionnaire(app, args):
+    client = app.test_client()
+    state = {"index": 0}
+
+    def submit():
+        # walks through all ten response pages
+        number = (state["index"] % 10) / 10 + 0.05
+        state["index"] += 1
+        client.post('/submit_form', data={'randomNumber': str(number)})
+
+    return {"page": measure(lambda: client.get('/emotion_questionnaire'), args.iterations),
+            "submit": measure(submit, args.iterations)}
+
+
+@benchmark("survey_analytics")
+def bench_survey_analytics(app, args):
+    # columnar cache of survey.csv repeated --survey-scale times: cold build, warm open, group-bys with and without memo
+    import analytics
+    import screening
+
+    workdir = tempfile.mkdtemp()
+    survey = os.path.join(workdir, "survey.csv")
+    with open(screening.SURVEY_PATH, encoding="utf-8") as source:
+        header, *rows = source.readlines()
+    with open(survey, "w", encoding="utf-8") as out:
+        out.write(header)
+        for _ in range(args.survey_scale):
+            out.writelines(rows)
+
+    cache = os.path.join(workdir, "cache")
+    queries = [["family_history"], ["work_interfere"], ["no_employees"], ["age_band", "Gender"]]
+    state = {"index": 0}
+
+    def query(store, memo):
+        if not memo:
+            store.memo.clear()
+        store.rate(queries[state["index"] % len(queries)])
+        state["index"] += 1
+
+    try:
+        started = time.perf_counter()
+        store = analytics.SurveyStore(survey, cache)
+        results = {"rows": store.rows, "build_seconds": round(time.perf_counter() - started, 3),
+                   "open": measure(lambda: analytics.SurveyStore(survey, cache), max(3, args.iterations // 20), warmup=1),
+                   "query": measure(lambda: query(store, False), args.iterations),
+                   "query_memoized": measure(lambda: query(store, True), args.iterations)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+@benchmark("home_under_load")
+def bench_home_under_load(app, args):
+    # /home latency alone and while --streams emotion streams are analysed in other threads;
+    # run once with MEDIQ_INFERENCE_WORKERS=0 and once with workers to see the GIL contention go away
+    from views import emotion
+
+    client = app.test_client()
+    frames = load_frames(args.video)
+    results = {"idle": measure(lambda: client.get('/home'), args.iterations)}
+
+    stop = threading.Event()
+    analysed = {"frames": 0}
+
+    def stream():
+        camera = fake_camera(frames)
+        while not stop.is_set():
+            camera.start_time = time.time()
+            camera.get_frame()
+            analysed["frames"] += 1
+
+    streams = [threading.Thread(target=stream, daemon=True) for _ in range(args.streams)]
+    for thread in streams:
+        thread.start()
+    started = time.perf_counter()
+    try:
+        results["loaded"] = measure(lambda: client.get('/home'), args.iterations)
+    finally:
+        stop.set()
+        for thread in streams:
+            thread.join()
+    results["streams"] = args.streams
+    results["inference_workers"] = emotion.inference_workers
+    results["stream_fps"] = round(analysed["frames"] / (time.perf_counter() - started), 1)
+    return results
+
+
+@benchmark("history")
+def bench_history(app, args):
+    # --history-events events over three years for 200 users: queueing cost of append() per request, group commit
+    # against a commit per event, and what a dashboard reads: first and a deep timeline page, 90 days of rollups
+    import history
+
+    workdir = tempfile.mkdtemp()
+    users = 200
+    span_ms = 3 * 365 * 86400 * 1000
+    start = history.now_ms() - span_ms
+    step = span_ms // args.history_events
+    log = history.HistoryLog(os.path.join(workdir, "history.db"), max_pending=args.history_events + 1)
+    state = {"index": 0}
+
+    def append():
+        index = state["index"]
+        state["index"] += 1
+        log.append(index % users + 1, history.KINDS[index % 3], ("happy", "sad", "neutral")[index % 7 % 3], 1.0,
+                   {"message": "how much sleep do I need"}, ts=start + index * step)
+
+    try:
+        results = {"events": args.history_events, "append": measure(append, args.iterations)}
+        started = time.perf_counter()
+        while state["index"] < args.history_events:
+            append()
+        log.flush(timeout=600)
+        results["group_commit_events_per_s"] = round(args.history_events / (time.perf_counter() - started))
+
+        # the same writes, partition insert and rollup upsert, in one transaction per event as a request would do them
+        single = history.HistoryLog(os.path.join(workdir, "single.db"))
+        con = single._connect()
+        count = min(args.history_events, 5000)
+        started = time.perf_counter()
+        for index in range(count):
+            single._write(con, [(index % users + 1, start + index * step, "chat", "sleep", 1.0, '{"message":"sleep"}')])
+        results["commit_per_event_events_per_s"] = round(count / (time.perf_counter() - started))
+        con.close()
+
+        deep = log.timeline(7, limit=200)
+        for _ in range(4):
+            deep = log.timeline(7, before=deep["next"], limit=200) if deep["next"] else deep
+        results["timeline_first_page"] = measure(lambda: log.timeline(7), args.iterations)
+        results["timeline_page_5"] = measure(lambda: log.timeline(7, before=deep["next"]), args.iterations)
+        results["daily_90_days"] = measure(lambda: log.daily(7, days=90), args.iterations)
+        results["partitions"] = len(log.stats()["partitions"])
+    finally:
+        log.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# ********************************** page weight **********************************
+class PageResources(HTMLParser):
+    # what a browser at DESKTOP_WIDTH css pixels would fetch from this site: stylesheets, scripts and,
+    # for a <picture>, the WebP candidate of the srcset that covers the drawn width
+    def __init__(self, dpr):
+        super().__init__()
+        self.dpr = dpr
+        self.blocking, self.images = [], []
+        self.picture = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'link' and attrs.get('rel') == 'stylesheet':
+            self.blocking.append(attrs.get('href'))
+        elif tag == 'script' and attrs.get('src') and 'async' not in attrs and 'defer' not in attrs:
+            self.blocking.append(attrs['src'])
+        elif tag == 'picture':
+            self.picture = None
+        elif tag == 'source' and attrs.get('type') == 'image/webp':
+            self.picture = attrs
+        elif tag == 'img':
+            chosen = self.picture or attrs
+            self.images.append(self.pick(chosen.get('srcset'), chosen.get('sizes'), attrs.get('src')))
+            self.picture = None
+
+    def pick(self, srcset, sizes, src):
+        if not srcset:
+            return src
+        # the default (last) entry of sizes, media conditions are for narrower screens than DESKTOP_WIDTH
+        drawn = (sizes or '100vw').split(',')[-1].strip()
+        width = float(drawn[:-2]) if drawn.endswith('px') else DESKTOP_WIDTH * float(drawn[:-2] or 100) / 100
+        candidates = sorted((int(descriptor[:-1]), url) for url, descriptor in (item.split() for item in srcset.split(',')))
+        return next((url for candidate, url in candidates if candidate >= width * self.dpr), candidates[-1][1])
+
+
+DESKTOP_WIDTH = 1280
+# modeled link, not a measurement: a slow 3G/4G-ish connection
+LINK_MBPS = 1.6
+LINK_RTT_MS = 150
+
+
+def page_weight(client, path, dpr):
+    page = client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+    parser = PageResources(dpr)
+    parser.feed(page.get_data(as_text=True))
+    local = lambda urls: [url for url in urls if url and url.startswith('/static/')]
+
+    def fetch(urls):
+        raw = transfer = 0
+        for url in urls:
+            response = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+            body = response.get_data()
+            transfer += len(body)
+            raw += len(gzip.decompress(body)) if response.headers.get('Content-Encoding') == 'gzip' else len(body)
+            response.close()
+        return raw, transfer
+
+    html = len(page.get_data())
+    css_js, css_js_transfer = fetch(local(parser.blocking))
+    images, images_transfer = fetch(local(parser.images))
+    blocking = html + css_js_transfer
+    bytes_per_ms = LINK_MBPS * 1e6 / 8 / 1000
+    return {"html_bytes": html, "css_js_bytes": css_js, "image_bytes": images, "image_count": len(local(parser.images)),
+            "transfer_bytes": html + css_js_transfer + images_transfer, "render_blocking_bytes": blocking,
+            # one round trip for the page, one for the stylesheets and scripts it links, then the bytes
+            "modeled_first_render_ms": round(2 * LINK_RTT_MS + blocking / bytes_per_ms),
+            "modeled_load_ms": round(3 * LINK_RTT_MS + (html + css_js_transfer + images_transfer) / bytes_per_ms)}
+
+
+@benchmark("page_weight")
+def bench_page_weight(app, args):
+    # / and /home with the plain /static files and with the built assets: server render time, bytes a browser
+    # fetches at 1x and 2x pixel density, and first render / load times on a modeled LINK_MBPS, LINK_RTT_MS link
+    import assets
+
+    if not os.path.exists(assets.MANIFEST):
+        assets.build(verbose=False)
+    client = app.test_client()
+    results = {"link": {"mbps": LINK_MBPS, "rtt_ms": LINK_RTT_MS, "viewport_px": DESKTOP_WIDTH}}
+    try:
+        for label, enabled in (("plain", False), ("built", True)):
+            app.config['MEDIQ_ASSETS'] = enabled
+            for path in ('/', '/home'):
+                page = results.setdefault(path, {}).setdefault(label, {})
+                page["render"] = measure(lambda: client.get(path), args.iterations)
+                page["dpr1"] = page_weight(client, path, 1)
+                page["dpr2"] = page_weight(client, path, 2)
+    finally:
+        app.config.pop('MEDIQ_ASSETS', None)
+    return results
+
+
+# runs in a fresh interpreter per measurement, startup cost and memory cannot be measured in a warm process
+ROLE_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+from factory import create_app
+create_app(sys.argv[1])
+seconds = time.perf_counter() - started
+try:
+    # ru_maxrss survives exec and would report the benchmark process, VmHWM starts fresh
+    with open("/proc/self/status") as status:
+        peak_kb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+except OSError:
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": seconds,
+                  "peak_rss_mb": peak_kb / 1024,
+                  "modules": len(sys.modules),
+                  "ml_modules": sorted(name for name in ("cv2", "keras", "tensorflow", "sklearn") if name in sys.modules)}))
+"""
+
+
+@benchmark("role_startup")
+def bench_role_startup(app, args):
+    # create_app per role: time to ready, peak resident memory and which ML libraries got imported
+    import subprocess
+
+    results = {}
+    for role in ("web", "ml", "all"):
+        runs = []
+        for _ in range(args.role_runs):
+            output = subprocess.run([sys.executable, "-c", ROLE_PROBE, role], cwd=HERE, check=True,
+                                    capture_output=True, text=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        results[role] = summarize([run["seconds"] for run in runs])
+        results[role]["peak_rss_mb"] = round(sorted(run["peak_rss_mb"] for run in runs)[len(runs) // 2], 1)
+        results[role]["modules"] = runs[-1]["modules"]
+        results[role]["ml_modules"] = runs[-1]["ml_modules"]
+    return results
+
+
+# ********************************** comparison **********************************
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(current, baseline, threshold):
+    now = flatten(current["benchmarks"])
+    before = flatten(baseline["benchmarks"])
+    regressions = []
+    print(f"{'metric':50} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in sorted(now):
+        if not key.endswith(("p50_ms", "p99_ms")) or key not in before or not before[key]:
+            continue
+        change = (now[key] - before[key]) / before[key]
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(f"{key:50} {before[key]:>12.3f} {now[key]:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MedIQ Advisor hot path benchmarks")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), help="run only this benchmark, can be repeated")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--video", help="recorded clip used instead of synthetic frames")
+    parser.add_argument("--streams", type=int, default=4, help="concurrent emotion streams for home_under_load")
+    parser.add_argument("--role-runs", type=int, default=3, help="fresh processes started per role by role_startup")
+    parser.add_argument("--history-events", type=int, default=200000, help="synthetic events written by the history benchmark")
+    parser.add_argument("--survey-scale", type=int, default=1, help="copies of survey.csv used by survey_analytics")
+    parser.add_argument("--output", help="write results as json")
+    parser.add_argument("--baseline", help="compare against a saved json result")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before a metric counts as regression")
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    sys.path.insert(0, HERE)
+
+    # the app reads these when it is created: throwaway database, stub mail server
+    smtp = start_smtp_stub()
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    database.close()
+    os.environ['MEDIQ_DATABASE_URI'] = 'sqlite:///' + database.name
+    os.environ['MEDIQ_SMTP_HOST'], os.environ['MEDIQ_SMTP_PORT'] = smtp.server_address[0], str(smtp.server_address[1])
+    os.environ['MEDIQ_SMTP_TLS'] = '0'
+
+    started = time.perf_counter()
+    from extensions import db
+    from factory import create_app
+    from views import emotion
+    app = create_app('all')
+    import_seconds = time.perf_counter() - started
+
+    results = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "iterations": args.iterations, "video": args.video, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "benchmarks": {"app_import": {"seconds": round(import_seconds, 3)}},
+    }
+    try:
+        for name in args.only or list(BENCHMARKS):
+            print(f"running {name}...")
+            results["benchmarks"][name] = BENCHMARKS[name](app, args)
+    finally:
+        smtp.shutdown()
+        if emotion.inference_pool is not None:
+            emotion.inference_pool.close()
+        with app.app_context():
+            db.engine.dispose()
+        os.remove(database.name)
+    results["meta"]["smtp_messages"] = smtp.messages
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as saved:
+            regressions = compare(results, json.load(saved), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
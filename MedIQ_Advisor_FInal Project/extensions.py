@@ -0,0 +1,23 @@
+import os
+
+from flask_sqlalchemy import SQLAlchemy
+
+import admission
+import history
+
+# Shared by the blueprints, bound to an app in factory.create_app
+db = SQLAlchemy()
+
+
+# ********************************** admission control **********************************
+# Token buckets live in memory unless MEDIQ_LIMITS_DB points at a sqlite file shared by all workers
+limits_db = os.environ.get('MEDIQ_LIMITS_DB')
+limiter = admission.Limiter(admission.SQLiteBucketStore(limits_db) if limits_db else None)
+stream_cap = admission.ConcurrencyCap("streams", int(os.environ.get('MEDIQ_MAX_STREAMS', '4')))
+inference_cap = admission.ConcurrencyCap("inference_jobs", int(os.environ.get('MEDIQ_MAX_INFERENCE_JOBS', '8')))
+
+
+# ********************************** user history **********************************
+# Append log of chat turns, emotion sessions and questionnaire outcomes, its writer thread starts on first use
+history_log = history.HistoryLog(os.environ.get('MEDIQ_HISTORY_DB', history.HISTORY_DB),
+                                 flush_interval=float(os.environ.get('MEDIQ_HISTORY_FLUSH_INTERVAL', '0.25')))
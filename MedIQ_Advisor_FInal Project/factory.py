@@ -0,0 +1,77 @@
+import importlib
+import os
+import sys
+
+from flask import Flask, jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import assets
+import metrics
+import migrations
+from extensions import db
+
+BLUEPRINTS = ('auth', 'content', 'chat', 'history', 'emotion', 'screening')
+
+# web: pages and accounts, imports neither opencv, keras nor sklearn
+# ml: emotion detection and screening, owns the models
+# A proxy in front sends /video_feed_emotion, /screening_score and /analytics/ to the ml processes
+# and everything else to the web processes, so both can be scaled on their own. Start both with
+# MEDIQ_TRUSTED_PROXIES=1 so rate limits see the clients and not the proxy.
+ROLES = {
+    'web': ('auth', 'content', 'chat', 'history'),
+    'ml': ('emotion', 'screening'),
+    'all': BLUEPRINTS,
+}
+
+
+def role_blueprints(role):
+    # a role name, or a comma separated list of blueprints such as "auth,content"
+    names = ROLES.get(role) or tuple(name.strip() for name in role.split(',') if name.strip())
+    unknown = [name for name in names if name not in BLUEPRINTS]
+    if unknown or not names:
+        raise ValueError(f"unknown role {role!r}, use one of {', '.join(ROLES)} or blueprints from {', '.join(BLUEPRINTS)}")
+    return names
+
+
+def create_app(role='all', config=None):
+    blueprints = role_blueprints(role)
+
+    # Turn off oneDNN custom operations
+    os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+
+    app = Flask(__name__, template_folder='templates')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('MEDIQ_DATABASE_URI', 'sqlite:///MedIQ_Advisor_flask.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['MEDIQ_ROLE'] = role
+    app.secret_key = 'Medical_Health_Advisor'
+    app.config['MEDIQ_TRUSTED_PROXIES'] = int(os.environ.get('MEDIQ_TRUSTED_PROXIES', '0'))
+    app.config.update(config or {})
+    # behind the proxy of the web/ml split remote_addr is the proxy itself, so every client would share one
+    # rate limit bucket; with MEDIQ_TRUSTED_PROXIES=n the client address and scheme are taken from the
+    # X-Forwarded-For/-Proto entries that the last n proxies added
+    trusted_proxies = app.config['MEDIQ_TRUSTED_PROXIES']
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+    metrics.init_app(app)
+    assets.init_app(app)
+
+    modules = [importlib.import_module('views.' + name) for name in blueprints]
+    for module in modules:
+        module.init_app(app)
+
+    if any(module.uses_db for module in modules):
+        db.init_app(app)
+        # ********************************** Creates all DB tables **********************************
+        with app.app_context():
+            metrics.instrument_sqlalchemy(db.engine)
+            migrations.upgrade_engine(db.engine)
+            db.create_all()
+            # accounts of other databases, such as the one of the first version of the app, are copied in on first start
+            for source in app.config.get('MEDIQ_MERGE_DATABASES', ()):
+                migrations.merge_engine(db.engine, source)
+
+    @app.route('/healthz')
+    def healthz():
+        return jsonify({'role': role, 'blueprints': list(blueprints), 'modules': len(sys.modules)})
+
+    return app
@@ -0,0 +1,300 @@
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import metrics
+
+# Per user history of chat turns, emotion sessions and questionnaire outcomes.
+#
+#   python history.py stats                      partitions, events and rollup rows
+#   python history.py prune --keep-months 24     drops whole months of events, the daily rollups stay
+#
+# Requests never write to sqlite themselves: append() queues the event and a writer thread commits
+# everything queued within flush_interval in one transaction (group commit), so a burst of chat turns
+# costs one fsync instead of one each. Events go to one table per calendar month (events_YYYYMM) with
+# an index on (user_id, ts), and the same transaction adds them to per user, per day counts in daily.
+# A timeline page only touches the newest partitions that hold the user's events, the dashboard
+# charts read daily and never scan events, however many years of them there are.
+# Days and months are UTC. Events are visible to readers once flushed, up to flush_interval later.
+
+HISTORY_DB = 'instance/history.db'
+KINDS = ('chat', 'emotion', 'questionnaire')
+PARTITION_PREFIX = 'events_'
+
+APPENDS = metrics.counter("mediq_history_appends_total", "History events queued for writing.", labels=("kind",))
+DROPPED = metrics.counter("mediq_history_dropped_total", "History events dropped because the queue was full.")
+BACKLOG = metrics.gauge("mediq_history_backlog", "History events waiting for the writer.")
+FLUSH_SECONDS = metrics.histogram("mediq_history_flush_seconds", "One group commit of queued history events.")
+FLUSH_EVENTS = metrics.histogram("mediq_history_flush_events", "History events written per group commit.",
+                                 buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000))
+QUERY_SECONDS = metrics.histogram("mediq_history_query_seconds", "History reads.", labels=("query",))
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def _utc(ts):
+    return datetime.fromtimestamp(ts / 1000.0, tz=timezone.utc)
+
+
+def partition_name(ts):
+    return PARTITION_PREFIX + _utc(ts).strftime('%Y%m')
+
+
+def day_of(ts):
+    return _utc(ts).strftime('%Y-%m-%d')
+
+
+class HistoryError(ValueError):
+    pass
+
+
+class HistoryLog(object):
+    def __init__(self, path=HISTORY_DB, flush_interval=0.25, max_pending=20000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.condition = threading.Condition()
+        self.pending = []
+        self.queued = 0  # events ever queued and ever written by this process, flush() waits for them to meet
+        self.written = 0
+        self.writer = None
+        self.pid = None
+        self.closing = False
+        self.created = set()  # partitions this process already made sure exist
+        self.local = threading.local()
+        self.partitions = ()
+        self.schema_version = None
+
+    def _connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("CREATE TABLE IF NOT EXISTS daily (user_id INTEGER NOT NULL, day TEXT NOT NULL, kind TEXT NOT NULL, "
+                    "label TEXT NOT NULL, events INTEGER NOT NULL, total REAL NOT NULL, "
+                    "PRIMARY KEY (user_id, day, kind, label)) WITHOUT ROWID")
+        return con
+
+    def _reader(self):
+        # one connection per thread and process for reads, the writer thread has its own
+        con = getattr(self.local, "con", None)
+        if con is None or getattr(self.local, "pid", None) != os.getpid():
+            con = self._connect()
+            self.local.con, self.local.pid = con, os.getpid()
+        return con
+
+    # ********************************** writes **********************************
+    def append(self, user_id, kind, label=None, value=None, payload=None, ts=None):
+        # never blocks on sqlite, False when the event was not queued
+        if user_id is None:
+            return False
+        if kind not in KINDS:
+            raise HistoryError(f"unknown history kind {kind!r}, use one of {', '.join(KINDS)}")
+        row = (int(user_id), ts or now_ms(), kind, label or '', None if value is None else float(value),
+               None if payload is None else json.dumps(payload, separators=(',', ':')))
+        with self.condition:
+            if self.pid != os.getpid():
+                # first use, or a forked worker: the parent's writer thread did not come along
+                self.pending, self.queued, self.written, self.created = [], 0, 0, set()
+                self.pid, self.closing = os.getpid(), False
+                self.writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self.writer.start()
+                atexit.register(self.close)
+            if len(self.pending) >= self.max_pending:
+                DROPPED.inc()
+                return False
+            self.pending.append(row)
+            self.queued += 1
+            if len(self.pending) == 1:
+                self.condition.notify_all()
+            BACKLOG.set(len(self.pending))
+        APPENDS.inc(kind=kind)
+        return True
+
+    def _run(self):
+        con = self._connect()
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+                if not self.closing:
+                    # the group commit window: whatever else arrives meanwhile goes into the same transaction
+                    self.condition.wait(self.flush_interval)
+                batch, self.pending = self.pending, []
+                BACKLOG.set(0)
+            try:
+                with FLUSH_SECONDS.time():
+                    self._write(con, batch)
+            except sqlite3.Error as e:
+                print("history: write failed, retrying:", e)
+                with self.condition:
+                    # a partition may have been pruned meanwhile, the retry creates it again
+                    self.created = set()
+                    self.pending = batch + self.pending
+                    BACKLOG.set(len(self.pending))
+                time.sleep(self.flush_interval or 0.1)
+                continue
+            FLUSH_EVENTS.observe(len(batch))
+            with self.condition:
+                self.written += len(batch)
+                self.condition.notify_all()
+        con.close()
+
+    def _write(self, con, batch):
+        partitions, rollups = {}, {}
+        for user_id, ts, kind, label, value, payload in batch:
+            partitions.setdefault(partition_name(ts), []).append((user_id, ts, kind, label, value, payload))
+            key = (user_id, day_of(ts), kind, label)
+            events, total = rollups.get(key, (0, 0.0))
+            rollups[key] = (events + 1, total + (value or 0.0))
+
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            for name, rows in partitions.items():
+                if name not in self.created:
+                    con.execute(f"CREATE TABLE IF NOT EXISTS {name} (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+                                "ts INTEGER NOT NULL, kind TEXT NOT NULL, label TEXT NOT NULL, value REAL, payload TEXT)")
+                    con.execute(f"CREATE INDEX IF NOT EXISTS {name}_user_ts ON {name} (user_id, ts)")
+                con.executemany(f"INSERT INTO {name} (user_id, ts, kind, label, value, payload) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            con.executemany("INSERT INTO daily (user_id, day, kind, label, events, total) VALUES (?, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT (user_id, day, kind, label) DO UPDATE SET "
+                            "events = events + excluded.events, total = total + excluded.total",
+                            [key + counts for key, counts in rollups.items()])
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        self.created.update(partitions)
+
+    def flush(self, timeout=5.0):
+        # waits until everything queued so far is committed, True when it was
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            target = self.queued
+            self.condition.notify_all()
+            while self.written < target and self.pid == os.getpid():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self, timeout=5.0):
+        with self.condition:
+            if self.writer is None or self.pid != os.getpid():
+                return
+            self.closing = True
+            self.condition.notify_all()
+        self.writer.join(timeout)
+
+    # ********************************** reads **********************************
+    def _partitions(self, con):
+        # newest first, listed again only when the schema changed (a month was added or dropped)
+        version = con.execute("PRAGMA schema_version").fetchone()[0]
+        if version != self.schema_version:
+            names = [name for (name,) in con.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+                                                      (PARTITION_PREFIX + '[0-9]*',))]
+            self.partitions, self.schema_version = tuple(sorted(names, reverse=True)), version
+        return self.partitions
+
+    def timeline(self, user_id, before=None, limit=20, kinds=()):
+        # newest first; before is the "next" of the previous page, keyset pagination so page 500 costs what page 1 does
+        if not 1 <= limit <= 200:
+            raise HistoryError("limit must be between 1 and 200")
+        unknown = [kind for kind in kinds if kind not in KINDS]
+        if unknown:
+            raise HistoryError(f"unknown history kind {unknown[0]!r}, use one of {', '.join(KINDS)}")
+        cursor = None
+        if before:
+            try:
+                ts, row_id = (int(part) for part in before.split('.'))
+            except ValueError:
+                raise HistoryError(f"bad cursor {before!r}")
+            cursor = (ts, row_id)
+
+        with QUERY_SECONDS.time(query="timeline"):
+            con = self._reader()
+            kind_filter = f" AND kind IN ({', '.join('?' * len(kinds))})" if kinds else ""
+            events = []
+            for name in self._partitions(con):
+                if cursor is not None and name > partition_name(cursor[0]):
+                    continue
+                where = "user_id = ?" + kind_filter
+                parameters = [user_id, *kinds]
+                if cursor is not None and name == partition_name(cursor[0]):
+                    where += " AND (ts, id) < (?, ?)"
+                    parameters += cursor
+                rows = con.execute(f"SELECT id, ts, kind, label, value, payload FROM {name} WHERE {where} "
+                                   "ORDER BY ts DESC, id DESC LIMIT ?", parameters + [limit - len(events)]).fetchall()
+                events.extend(rows)
+                if len(events) == limit:
+                    break
+
+        page = [{'id': f"{ts}.{row_id}", 'time': _utc(ts).isoformat(timespec='seconds'), 'kind': kind, 'label': label,
+                 'value': value, 'data': None if payload is None else json.loads(payload)}
+                for row_id, ts, kind, label, value, payload in events]
+        return {'events': page, 'next': page[-1]['id'] if len(page) == limit else None}
+
+    def daily(self, user_id, days=30, until=None, kinds=()):
+        # per day counts of the last `days` days up to `until` (a date, today by default)
+        if not 1 <= days <= 3660:
+            raise HistoryError("days must be between 1 and 3660")
+        until = until or datetime.now(timezone.utc).date()
+        since = until - timedelta(days=days - 1)
+        with QUERY_SECONDS.time(query="daily"):
+            rows = self._reader().execute("SELECT day, kind, label, events, total FROM daily "
+                                          "WHERE user_id = ? AND day BETWEEN ? AND ? ORDER BY day",
+                                          (user_id, since.isoformat(), until.isoformat())).fetchall()
+        return {'since': since.isoformat(), 'until': until.isoformat(),
+                'days': [{'day': day, 'kind': kind, 'label': label, 'events': events, 'total': total}
+                         for day, kind, label, events, total in rows if not kinds or kind in kinds]}
+
+    # ********************************** maintenance **********************************
+    def stats(self):
+        con = self._reader()
+        partitions = {name: con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                      for name in sorted(self._partitions(con))}
+        return {'partitions': partitions, 'events': sum(partitions.values()),
+                'daily_rows': con.execute("SELECT COUNT(*) FROM daily").fetchone()[0]}
+
+    def prune(self, keep_months):
+        # whole months go at once, a DROP TABLE instead of deleting row by row
+        today = datetime.now(timezone.utc)
+        month = today.year * 12 + today.month - 1 - keep_months
+        oldest_kept = PARTITION_PREFIX + f"{month // 12:04d}{month % 12 + 1:02d}"
+        con = self._reader()
+        dropped = [name for name in self._partitions(con) if name < oldest_kept]
+        for name in dropped:
+            con.execute(f"DROP TABLE {name}")
+        return dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MedIQ Advisor user history")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="partitions, events and rollup rows")
+    prune = commands.add_parser("prune", help="drop the events of months older than --keep-months")
+    prune.add_argument("--keep-months", type=int, required=True)
+    parser.add_argument("--db", default=os.environ.get('MEDIQ_HISTORY_DB', HISTORY_DB))
+    args = parser.parse_args()
+
+    log = HistoryLog(args.db)
+    if args.command == "stats":
+        print(json.dumps(log.stats(), indent=1))
+    else:
+        dropped = log.prune(args.keep_months)
+        print(f"dropped {len(dropped)} partitions: {', '.join(dropped) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
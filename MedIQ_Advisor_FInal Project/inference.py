@@ -0,0 +1,242 @@
+import multiprocessing
+import pickle
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import metrics
+
+EMOTION_MODEL_JSON = 'static/emotion_detection/emotion_model1.json'
+EMOTION_MODEL_WEIGHTS = 'static/emotion_detection/emotion_model1.h5'
+FACE_CASCADE = 'static/emotion_detection/haarcascade_frontalface_default.xml'
+SCREENING_MODEL = 'static/models/screening/model.sav'
+
+emotion_dict = {0: 'angry', 1: 'happy', 2: 'neutral', 3: 'sad', 4: 'surprise'}
+
+INFERENCE_SECONDS = metrics.histogram("mediq_inference_seconds", "Round trip to an inference worker.", labels=("kind",))
+INFERENCE_REJECTED = metrics.counter("mediq_inference_rejected_total", "Inference requests answered without a result.", labels=("kind", "reason"))
+INFERENCE_RESTARTS = metrics.counter("mediq_inference_worker_restarts_total", "Inference workers restarted after a crash or hang.")
+
+
+# ********************************** model loading **********************************
+def load_emotion_model():
+    from keras.models import model_from_json
+
+    # Load model architecture from JSON file
+    with open(EMOTION_MODEL_JSON, 'r') as json_file:
+        classifier = model_from_json(json_file.read())
+    # Load weights into the model
+    classifier.load_weights(EMOTION_MODEL_WEIGHTS)
+    return classifier
+
+
+def load_face_cascade():
+    return cv2.CascadeClassifier(FACE_CASCADE)
+
+
+def load_screening_model():
+    with open(SCREENING_MODEL, 'rb') as file:
+        return pickle.load(file)
+
+
+# ********************************** emotion detection **********************************
+def detect_faces(face_cascade, frame):
+    # returns the gray frame and the (x, y, w, h) boxes of the faces in it
+    img_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    with metrics.FACE_DETECT_SECONDS.time():
+        faces = face_cascade.detectMultiScale(img_gray, scaleFactor=1.3, minNeighbors=5)
+    return img_gray, faces
+
+
+def classify_faces(classifier, rois):
+    # rois is a (n, 48, 48) uint8 stack, returns one label per roi ('' for blank crops)
+    labels = [''] * len(rois)
+    usable = rois.reshape(len(rois), -1).any(axis=1)
+    if usable.any():
+        batch = (rois[usable].astype('float32') / 255.0)[..., np.newaxis]
+        with metrics.EMOTION_PREDICT_SECONDS.time():
+            predictions = classifier.predict(batch, verbose=0)
+        for index, prediction in zip(np.flatnonzero(usable), predictions):
+            labels[index] = emotion_dict[int(np.argmax(prediction))]
+    return labels
+
+
+def detect_emotions_batch(face_cascade, classifier, frames):
+    # returns one [(x, y, w, h, label)] list per frame, the faces of all frames go through the classifier in one batch
+    boxes = []
+    rois = []
+    for frame in frames:
+        img_gray, faces = detect_faces(face_cascade, frame)
+        boxes.append(faces)
+        rois.extend(cv2.resize(img_gray[y:y+h, x:x+w], (48, 48), interpolation=cv2.INTER_AREA) for (x, y, w, h) in faces)
+    if not rois:
+        return [[] for _ in frames]
+
+    labels = iter(classify_faces(classifier, np.stack(rois)))
+    return [[(int(x), int(y), int(w), int(h), next(labels)) for (x, y, w, h) in faces] for faces in boxes]
+
+
+def detect_emotions(face_cascade, classifier, frame):
+    # returns [(x, y, w, h, label)], all faces of a frame go through the classifier in one batch
+    return detect_emotions_batch(face_cascade, classifier, [frame])[0]
+
+
+def draw_emotions(frame, detections):
+    for (x, y, w, h, label) in detections:
+        cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
+        if label:
+            cv2.putText(frame, label, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+
+# ********************************** inference worker process **********************************
+def _worker_main(conn, shm_name):
+    # every worker loads the models once and then serves requests until the pipe closes
+    shm = shared_memory.SharedMemory(name=shm_name)
+    face_cascade = load_face_cascade()
+    classifier = load_emotion_model()
+    screening_model = load_screening_model()
+    conn.send((True, "ready"))
+
+    while True:
+        try:
+            kind, message = conn.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            if kind == "emotion":
+                # the frame is read straight out of shared memory, it never goes through pickle
+                shape, dtype = message
+                frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                result = detect_emotions(face_cascade, classifier, frame)
+            elif kind == "screening":
+                result = screening_model.predict_proba(message)[:, 1].tolist()
+            else:
+                raise ValueError("unknown request " + str(kind))
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, str(e)))
+    shm.close()
+
+
+class _Slot(object):
+    def __init__(self, context, frame_capacity):
+        self.shm = shared_memory.SharedMemory(create=True, size=frame_capacity)
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, self.shm.name), daemon=True)
+        self.process.start()
+        child.close()
+
+    def close(self):
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(5)
+        self.shm.close()
+        self.shm.unlink()
+
+
+class InferencePool(object):
+    # Requests that find every worker busy for longer than acquire_timeout, or that take longer
+    # than timeout, get None back so the caller can degrade instead of queueing behind the models.
+    def __init__(self, workers=2, timeout=2.0, acquire_timeout=0.05, frame_capacity=1920 * 1080 * 3, startup_timeout=120):
+        # tensorflow is not fork safe, workers always start from a fresh interpreter
+        self.context = multiprocessing.get_context("spawn")
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.frame_capacity = frame_capacity
+        self.startup_timeout = startup_timeout
+        self.free = queue.Queue()
+        self.slots = []
+        try:
+            for _ in range(workers):
+                self.slots.append(self._start())
+        except Exception:
+            self.close()
+            raise
+        for index in range(workers):
+            self.free.put(index)
+
+    def _start(self):
+        slot = _Slot(self.context, self.frame_capacity)
+        try:
+            if not slot.conn.poll(self.startup_timeout):
+                raise RuntimeError("inference worker did not start")
+            slot.conn.recv()
+        except (EOFError, OSError):
+            # the worker died while loading the models, its shared memory block goes with it
+            slot.process.join(5)
+            exitcode = slot.process.exitcode
+            slot.close()
+            raise RuntimeError(f"inference worker exited during startup, exit code {exitcode}")
+        except Exception:
+            slot.close()
+            raise
+        return slot
+
+    def _recover(self, index):
+        # a late answer frees the worker again, a dead or hung worker is replaced
+        slot = self.slots[index]
+        try:
+            if slot.conn.poll(self.timeout * 10):
+                slot.conn.recv()
+                self.free.put(index)
+                return
+        except (EOFError, OSError):
+            pass
+        INFERENCE_RESTARTS.inc()
+        slot.close()
+        try:
+            self.slots[index] = self._start()
+        except Exception as e:
+            print("Error restarting inference worker:", e)
+            return
+        self.free.put(index)
+
+    def _call(self, kind, message, frame=None):
+        try:
+            index = self.free.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            INFERENCE_REJECTED.inc(kind=kind, reason="saturated")
+            return None
+
+        slot = self.slots[index]
+        started = time.perf_counter()
+        try:
+            if frame is not None:
+                np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.shm.buf)[...] = frame
+            slot.conn.send((kind, message))
+            if not slot.conn.poll(self.timeout):
+                INFERENCE_REJECTED.inc(kind=kind, reason="timeout")
+                threading.Thread(target=self._recover, args=(index,), daemon=True).start()
+                return None
+            ok, result = slot.conn.recv()
+        except (EOFError, OSError):
+            INFERENCE_REJECTED.inc(kind=kind, reason="worker_died")
+            threading.Thread(target=self._recover, args=(index,), daemon=True).start()
+            return None
+
+        self.free.put(index)
+        INFERENCE_SECONDS.observe(time.perf_counter() - started, kind=kind)
+        if not ok:
+            INFERENCE_REJECTED.inc(kind=kind, reason="error")
+            print("Error in inference worker:", result)
+            return None
+        return result
+
+    def detect_emotions(self, frame):
+        if frame.nbytes > self.frame_capacity:
+            INFERENCE_REJECTED.inc(kind="emotion", reason="too_large")
+            return None
+        return self._call("emotion", (frame.shape, frame.dtype.str), frame)
+
+    def screening_scores(self, features):
+        return self._call("screening", features)
+
+    def close(self):
+        slots, self.slots = self.slots, []
+        for slot in slots:
+            slot.close()
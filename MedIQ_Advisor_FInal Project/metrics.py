@@ -0,0 +1,242 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+
+from flask import Response, g, request
+
+# Prometheus default buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+# ********************************** metric types **********************************
+class Counter(object):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            items = list(self.values.items())
+        return [f"{self.name}{_label_text(self.labels, key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class _Timer(object):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Histogram(object):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        with self.lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self.series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = _label_text(self.labels + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+def _register(cls, name, help, **kwargs):
+    with _registry_lock:
+        metric = REGISTRY.get(name)
+        if metric is None:
+            metric = REGISTRY[name] = cls(name, help, **kwargs)
+        return metric
+
+
+def counter(name, help, labels=()):
+    return _register(Counter, name, help, labels=labels)
+
+
+def gauge(name, help, labels=()):
+    return _register(Gauge, name, help, labels=labels)
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, help, labels=labels, buckets=buckets)
+
+
+def render():
+    lines = []
+    for metric in list(REGISTRY.values()):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# hot paths of the app, timed where they happen
+REQUEST_SECONDS = histogram("mediq_request_seconds", "Request latency by route.", labels=("endpoint", "method", "status"))
+FACE_DETECT_SECONDS = histogram("mediq_face_detect_seconds", "Haar cascade detectMultiScale per frame.")
+EMOTION_PREDICT_SECONDS = histogram("mediq_emotion_predict_seconds", "Emotion classifier predict per face.")
+FRAME_ENCODE_SECONDS = histogram("mediq_frame_encode_seconds", "cv2.imencode per frame.")
+DB_QUERY_SECONDS = histogram("mediq_db_query_seconds", "SQLAlchemy statement execution.", labels=("endpoint", "statement"))
+SMTP_SECONDS = histogram("mediq_smtp_seconds", "Password reset e-mail delivery.", buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+SMTP_FAILURES = counter("mediq_smtp_failures_total", "Password reset e-mails that could not be sent.")
+
+
+# ********************************** sampling profiler **********************************
+class StackSampler(object):
+    # samples one thread's stack every interval and keeps folded stacks for flamegraph.pl / speedscope
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = StackCounter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, "w") as out:
+            for stack, count in self.stacks.most_common():
+                out.write(f"{stack} {count}\n")
+
+
+# ********************************** flask wiring **********************************
+def _db_endpoint():
+    try:
+        return request.endpoint or ""
+    except RuntimeError:
+        # outside of a request (db.create_all at startup)
+        return ""
+
+
+def instrument_sqlalchemy(engine):
+    from sqlalchemy import event
+
+    # the start time lives on the statement's execution context, a statement that fails takes it along
+    # instead of leaving it behind on the pooled connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.mediq_query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "mediq_query_started", None)
+        if started is not None:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, endpoint=_db_endpoint(), statement=statement.split(None, 1)[0].upper())
+
+
+def init_app(app, profile_header="X-Profile"):
+    # the sampling profiler only runs when it is switched on and the request asks for it
+    profiling = os.environ.get("MEDIQ_PROFILING") == "1"
+    profile_dir = os.environ.get("MEDIQ_PROFILE_DIR", "profiles")
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        if profiling and request.headers.get(profile_header):
+            g.sampler = StackSampler(threading.get_ident())
+            g.sampler.start()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or "unknown",
+                                    method=request.method, status=response.status_code)
+        return response
+
+    @app.teardown_request
+    def write_profile(exc):
+        sampler = g.pop("sampler", None)
+        if sampler is None:
+            return
+        sampler.stop()
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{int(time.time() * 1000)}_{request.endpoint or 'unknown'}.folded")
+        sampler.write(path)
+        app.logger.info("profile written to %s", path)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
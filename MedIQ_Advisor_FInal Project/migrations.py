@@ -0,0 +1,242 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable
+
+from models import ContactMessage, User
+
+# Brings the sqlite databases of both versions of the app to the schema in models.py.
+#
+#   python migrations.py upgrade instance/MedIQ_Advisor_flask.db
+#   python migrations.py merge ../MedIQ_Advisor-flask/instance/MedIQ_Advisor_flask.db instance/MedIQ_Advisor_flask.db
+#
+# upgrade rewrites a database in place after taking a backup next to it, factory.create_app runs it on
+# startup. merge copies the accounts and messages of another database (any version) into the target,
+# accounts whose username or email is already taken are skipped and listed. The app factory merges the
+# databases listed in MEDIQ_MERGE_DATABASES on startup, once per target (see merge_once).
+#
+# PRAGMA user_version holds the schema version, 0 is one of the two original schemas:
+#   legacy  MedIQ_Advisor-flask: user(firstName, lastName, ...), contact_message(phone, description)
+#   final   this app before the factory: user(fullName, gender, age, ... all NOT NULL), contact_message(subject, message)
+
+SCHEMA_VERSION = 1
+
+USER_COLUMNS = [column.name for column in User.__table__.columns]
+CONTACT_COLUMNS = [column.name for column in ContactMessage.__table__.columns]
+
+# column of the new table -> sql expression over the old one, missing columns become NULL
+COPY = {
+    'legacy': {
+        'user': {'id': 'id', 'fullName': "trim(\"firstName\" || ' ' || \"lastName\")", 'username': 'username',
+                 'email': 'email', 'password': 'password'},
+        'contact_message': {'id': 'id', 'name': 'name', 'email': 'email', 'phone': 'phone', 'message': 'description'},
+    },
+    'final': {
+        'user': {name: f'"{name}"' for name in USER_COLUMNS},
+        'contact_message': {'id': 'id', 'name': 'name', 'email': 'email', 'subject': 'subject', 'message': 'message'},
+    },
+}
+
+
+def create_sql(model):
+    return str(CreateTable(model.__table__).compile(dialect=sqlite.dialect()))
+
+
+def connect(path):
+    # long enough to wait for another worker that is rebuilding the tables
+    con = sqlite3.connect(path, isolation_level=None, timeout=60)
+    con.row_factory = sqlite3.Row
+    return con
+
+
+def table_columns(con, table):
+    return [row['name'] for row in con.execute(f'PRAGMA table_info("{table}")')]
+
+
+def detect(con):
+    if con.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+        return 'current'
+    columns = table_columns(con, 'user')
+    if not columns:
+        return 'empty'
+    if 'firstName' in columns:
+        return 'legacy'
+    if 'fullName' in columns:
+        return 'final'
+    raise RuntimeError(f"unknown user table layout: {columns}")
+
+
+def backup(path):
+    # sqlite's online backup through a connection of its own, it can read while upgrade() holds the write
+    # lock and has not changed anything yet
+    target = f"{path}.{time.strftime('%Y%m%d%H%M%S')}.bak"
+    source, copy = connect(path), sqlite3.connect(target)
+    try:
+        source.backup(copy)
+    finally:
+        copy.close()
+        source.close()
+    return target
+
+
+def _rebuild(con, model, mapping):
+    # sqlite cannot drop NOT NULL or rename columns in place, the table is created again and the rows copied over
+    table = model.__tablename__
+    con.execute(f'ALTER TABLE "{table}" RENAME TO "{table}_old"')
+    con.execute(create_sql(model))
+    old_columns = table_columns(con, table + '_old')
+    if old_columns:
+        targets = ', '.join(f'"{name}"' for name in mapping)
+        sources = ', '.join(mapping.values())
+        con.execute(f'INSERT INTO "{table}" ({targets}) SELECT {sources} FROM "{table}_old"')
+    con.execute(f'DROP TABLE "{table}_old"')
+
+
+def upgrade(path, keep_backup=True):
+    # returns the schema the database had, a backup is only taken when something changes
+    con = connect(path)
+    try:
+        if detect(con) == 'current':
+            return 'current'
+
+        # workers starting together all get here; the schema is looked at again under the write lock,
+        # so the first one upgrades (and backs up) and the others find it current
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            schema = detect(con)
+            if schema == 'current':
+                con.execute('ROLLBACK')
+                return schema
+            if schema != 'empty' and keep_backup:
+                print(f"{path}: {schema} schema, backup in {backup(path)}")
+            if schema == 'empty':
+                for model in (User, ContactMessage):
+                    con.execute(create_sql(model).replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+            else:
+                for model in (User, ContactMessage):
+                    table = model.__tablename__
+                    if table_columns(con, table):
+                        _rebuild(con, model, COPY[schema][table])
+                    else:
+                        con.execute(create_sql(model))
+            con.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            con.execute('COMMIT')
+        except Exception:
+            con.execute('ROLLBACK')
+            raise
+        return schema
+    finally:
+        con.close()
+
+
+def upgrade_engine(engine):
+    # called by the app factory, only file based sqlite databases are migrated here
+    if engine.url.get_backend_name() != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return None
+    directory = os.path.dirname(engine.url.database)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return upgrade(engine.url.database)
+
+
+def merge(source, target):
+    # the source file is never written to, it is upgraded in a temporary copy
+    upgrade(target)
+    with tempfile.TemporaryDirectory() as workdir:
+        copy = os.path.join(workdir, 'source.db')
+        original = sqlite3.connect(source)
+        try:
+            backup_to = sqlite3.connect(copy)
+            original.backup(backup_to)
+            backup_to.close()
+        finally:
+            original.close()
+        upgrade(copy, keep_backup=False)
+
+        con = connect(target)
+        try:
+            con.execute('ATTACH DATABASE ? AS source', (copy,))
+            skipped = [row['username'] for row in con.execute(
+                'SELECT username FROM source.user AS s WHERE EXISTS '
+                '(SELECT 1 FROM main.user AS m WHERE m.username = s.username OR m.email = s.email) ORDER BY s.id')]
+            user_columns = ', '.join(f'"{name}"' for name in USER_COLUMNS if name != 'id')
+            contact_columns = ', '.join(f'"{name}"' for name in CONTACT_COLUMNS if name != 'id')
+
+            con.execute('BEGIN IMMEDIATE')
+            try:
+                users = con.execute(
+                    f'INSERT INTO main.user ({user_columns}) SELECT {user_columns} FROM source.user AS s WHERE NOT EXISTS '
+                    '(SELECT 1 FROM main.user AS m WHERE m.username = s.username OR m.email = s.email) ORDER BY s.id').rowcount
+                # messages already copied by an earlier merge are not copied twice
+                messages = con.execute(
+                    f'INSERT INTO main.contact_message ({contact_columns}) SELECT {contact_columns} FROM source.contact_message AS s '
+                    'WHERE NOT EXISTS (SELECT 1 FROM main.contact_message AS m WHERE m.name = s.name AND m.email = s.email '
+                    'AND m.message = s.message) ORDER BY s.id').rowcount
+                con.execute('COMMIT')
+            except Exception:
+                con.execute('ROLLBACK')
+                raise
+            con.execute('DETACH DATABASE source')
+        finally:
+            con.close()
+    return {'users': users, 'messages': messages, 'skipped_users': skipped}
+
+
+def merge_once(source, target):
+    # <source>.merged lists the targets the source already went into, None when there was nothing to do;
+    # workers starting together may both merge, which copies nothing twice
+    target = os.path.abspath(target)
+    marker = source + '.merged'
+    if os.path.exists(marker):
+        with open(marker) as saved:
+            if target in saved.read().splitlines():
+                return None
+    result = merge(source, target)
+    with open(marker, 'a') as saved:
+        saved.write(target + '\n')
+    return result
+
+
+def merge_engine(engine, source):
+    # called by the app factory, a database that is not a sqlite file cannot take the accounts
+    if engine.url.get_backend_name() != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        raise RuntimeError(f"cannot merge {source} into {engine.url}, run migrations.py merge by hand")
+    if not os.path.exists(source):
+        raise RuntimeError(f"{source} is listed in MEDIQ_MERGE_DATABASES but does not exist")
+    result = merge_once(source, engine.url.database)
+    if result is not None:
+        print(f"{source}: imported {result['users']} user(s) and {result['messages']} message(s) into {engine.url.database}")
+        for username in result['skipped_users']:
+            print(f"  skipped {username}: username or email already taken")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MedIQ Advisor database migrations")
+    commands = parser.add_subparsers(dest='command', required=True)
+    upgrade_parser = commands.add_parser('upgrade', help='bring a database to the current schema')
+    upgrade_parser.add_argument('database')
+    merge_parser = commands.add_parser('merge', help='copy accounts and messages of another database into this one')
+    merge_parser.add_argument('source')
+    merge_parser.add_argument('target')
+    args = parser.parse_args()
+
+    if args.command == 'upgrade':
+        schema = upgrade(args.database)
+        print(f"{args.database}: {'already current' if schema == 'current' else 'upgraded from ' + schema} (version {SCHEMA_VERSION})")
+    else:
+        if not os.path.exists(args.source):
+            sys.exit(f"{args.source} does not exist")
+        result = merge(args.source, args.target)
+        print(f"imported {result['users']} user(s) and {result['messages']} message(s) into {args.target}")
+        for username in result['skipped_users']:
+            print(f"  skipped {username}: username or email already taken")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+from extensions import db
+
+# One schema for both apps. The profile fields of the current sign-up form are nullable because
+# accounts imported from the first version of the app (MedIQ_Advisor-flask) never had them, see
+# migrations.py for how older databases are brought to this schema.
+
+
+# ********************************** DB User table **********************************
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    fullName = db.Column(db.String(15), nullable=False)
+    gender = db.Column(db.String(10), nullable=True)
+    age = db.Column(db.Integer, nullable=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    mobile_no = db.Column(db.String(10), nullable=True)
+    city = db.Column(db.String(100), nullable=True)
+    emergency_contact = db.Column(db.String(10), nullable=True)
+    concern = db.Column(db.Text, nullable=True)  # Assuming concern can be optional
+    password = db.Column(db.String(80), nullable=False)
+
+
+# ********************************** DB Contact table **********************************
+class ContactMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(100), nullable=False)
+    phone = db.Column(db.String(10), nullable=True)
+    subject = db.Column(db.String(100), nullable=True)
+    message = db.Column(db.Text, nullable=False)
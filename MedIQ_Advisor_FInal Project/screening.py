@@ -0,0 +1,87 @@
+import csv
+
+import numpy as np
+
+SURVEY_PATH = 'static/models/screening/survey.csv'
+
+# ********************************** survey cleaning (same steps as screening.ipynb) **********************************
+# Columns the ColumnTransformer of the notebook fed to the model, in the same order
+FEATURE_COLUMNS = ['Gender', 'self_employed', 'family_history', 'work_interfere', 'no_employees', 'remote_work',
+                   'tech_company', 'benefits', 'care_options', 'wellness_program', 'seek_help', 'anonymity', 'leave',
+                   'mental_health_consequence', 'phys_health_consequence', 'coworkers', 'supervisor',
+                   'mental_health_interview', 'phys_health_interview', 'mental_vs_physical', 'obs_consequence']
+
+MISSING = ('', 'NA')
+
+GENDER_GROUPS = {
+    'Male': ['Male', 'male', 'M', 'm', 'Male ', 'Cis Male', 'Man', 'cis male', 'Mail', 'Male (CIS)', 'Male-ish', 'maile',
+             'Cis Man', 'Malr', 'Mal', 'Make', 'msle'],
+    'Female': ['Female', 'female', 'F', 'f', 'Women', 'Woman', 'woman', 'Female ', 'Female (cis)', 'cis-female/femme',
+               'femail', 'women', 'Femake', 'Cis Female'],
+    'Non-Binary': ['Female (trans)', 'Androgyne', 'queer', 'Neuter', 'Trans woman', 'male leaning androgynous',
+                   'Guy (-ish) ^_^', 'Agender', 'Genderqueer', 'fluid', 'Enby', 'Nah', 'non-binary', 'queer/she/they',
+                   'something kinda male?', 'Trans-female', 'ostensibly male, unsure what that really means'],
+}
+GENDER_MAP = {raw: group for group, values in GENDER_GROUPS.items() for raw in values}
+
+
+def clean_row(row):
+    # returns None for rows the notebook dropped (age outside 18-60)
+    try:
+        age = int(float(row['Age']))
+    except ValueError:
+        return None
+    if age > 60 or age < 18:
+        return None
+
+    cleaned = dict(row)
+    cleaned['Age'] = age
+    cleaned['Gender'] = GENDER_MAP.get(row['Gender'], row['Gender'])
+    if row['self_employed'] in MISSING:
+        cleaned['self_employed'] = 'No'
+    if row['work_interfere'] in MISSING:
+        cleaned['work_interfere'] = 'N/A'
+    return cleaned
+
+
+def load_survey(path=SURVEY_PATH):
+    with open(path, 'r', encoding='utf-8') as csvfile:
+        rows = [clean_row(row) for row in csv.DictReader(csvfile)]
+    return [row for row in rows if row is not None]
+
+
+# ********************************** encoding and scoring **********************************
+class AnswerError(ValueError):
+    # answers that are missing or that the model never saw, the request is rejected instead of scored
+    def __init__(self, missing, unknown):
+        self.missing = missing
+        self.unknown = unknown
+        problems = []
+        if missing:
+            problems.append('missing ' + ', '.join(missing))
+        if unknown:
+            problems.append('unknown answer for ' + ', '.join(unknown))
+        super().__init__('; '.join(problems))
+
+
+def fit_categories(rows):
+    # OrdinalEncoder sorts the categories it saw, so code i is the i-th sorted value
+    return {column: {value: code for code, value in enumerate(sorted({row[column] for row in rows}))}
+            for column in FEATURE_COLUMNS}
+
+
+def encode(rows, categories):
+    features = np.empty((len(rows), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for i, row in enumerate(rows):
+        missing = [column for column in FEATURE_COLUMNS if row.get(column, '') == '']
+        unknown = [column for column in FEATURE_COLUMNS
+                   if column not in missing and row[column] not in categories[column]]
+        if missing or unknown:
+            raise AnswerError(missing, unknown)
+        features[i] = [categories[column][row[column]] for column in FEATURE_COLUMNS]
+    return features
+
+
+def screening_scores(model, features):
+    # probability of the "treatment: Yes" class
+    return model.predict_proba(features)[:, 1]
@@ -263,12 +263,14 @@ function sendMessage() {
     // Split user input into individual words
     const words = userInput.split(" ");
     let botResponse = null;
+    let topic = "";
 
     // Check each word against predefined responses
     words.forEach(word => {
         const response = getManualResponse(word);
         if (response) {
             botResponse = response;
+            topic = word;
         }
     });
 
@@ -280,6 +282,9 @@ function sendMessage() {
     // Display bot response
     displayBotMessage(botResponse);
 
+    // Save the turn to the user's history
+    recordTurn(userInput, botResponse, topic);
+
     // Clear input field
     document.getElementById("user-input").value = "";
 
@@ -287,6 +292,19 @@ function sendMessage() {
     chatBox.scrollTop = chatBox.scrollHeight;
 }
 
+function recordTurn(message, reply, topic) {
+    // fire and forget, the server ignores turns of visitors who did not sign in
+    var form = new FormData();
+    form.append("message", message);
+    form.append("reply", reply);
+    form.append("topic", topic);
+    if (navigator.sendBeacon) {
+        navigator.sendBeacon("/history/chat", form);
+    } else {
+        fetch("/history/chat", { method: "POST", body: form, credentials: "same-origin" }).catch(function () {});
+    }
+}
+
 function displayBotMessage(message) {
     var chatBox = document.getElementById("chat-box");
     var botMessage = document.createElement("div");
@@ -0,0 +1,319 @@
+import argparse
+import concurrent.futures
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from inference import detect_emotions_batch, emotion_dict, load_emotion_model, load_face_cascade
+
+# Offline emotion analysis of recorded sessions, the same detection and classification as /video_feed_emotion.
+#
+#   python video_analysis.py session.mp4                            timeline in session.emotions.npz
+#   python video_analysis.py session.mp4 -o session.csv --workers 4
+#   python video_analysis.py session.mp4 --sample-fps 5             analyse 5 frames of every second
+#
+# Progress is checkpointed next to the output, running the same command again after an interruption
+# continues with the chunks that were not analysed yet.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EMOTIONS = [emotion_dict[code] for code in sorted(emotion_dict)]
+CHECKPOINT_VERSION = 1
+
+
+# ********************************** worker process **********************************
+_models = {}
+
+
+def _init_worker(threads):
+    # one core per worker: the models must not spread over all cores or the workers fight each other
+    os.chdir(HERE)
+    cv2.setNumThreads(threads)
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+    _models["face_cascade"] = load_face_cascade()
+    _models["classifier"] = load_emotion_model()
+
+
+def analyse_chunk(chunk_id, frames, batch_size):
+    # returns the emotion counts and face count of every frame plus the cpu time the chunk took
+    started = time.process_time()
+    counts = np.zeros((len(frames), len(EMOTIONS)), dtype=np.uint16)
+    faces = np.zeros(len(frames), dtype=np.uint16)
+    codes = {label: code for code, label in enumerate(EMOTIONS)}
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        for offset, detections in enumerate(detect_emotions_batch(_models["face_cascade"], _models["classifier"], batch)):
+            faces[start + offset] = len(detections)
+            for (x, y, w, h, label) in detections:
+                if label:
+                    counts[start + offset, codes[label]] += 1
+    return chunk_id, counts, faces, time.process_time() - started
+
+
+# ********************************** reader thread **********************************
+class FrameReader(threading.Thread):
+    # decodes the video and hands out (chunk_id, frame numbers, frames) chunks through a bounded queue,
+    # frames of chunks that are already done are only grabbed, not decoded
+    def __init__(self, path, chunk_size, stride, done, depth):
+        super().__init__(daemon=True)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.stride = stride
+        self.done = done
+        self.chunks = queue.Queue(depth)
+        self.stopped = threading.Event()
+        self.decode_seconds = 0.0
+        self.frames_read = 0
+        self.error = None
+
+    def run(self):
+        capture = cv2.VideoCapture(self.path)
+        try:
+            numbers, frames = [], []
+            number = 0
+            sampled = 0
+            while not self.stopped.is_set():
+                started = time.perf_counter()
+                wanted = number % self.stride == 0 and sampled // self.chunk_size not in self.done
+                if wanted:
+                    success, frame = capture.read()
+                else:
+                    success, frame = capture.grab(), None
+                self.decode_seconds += time.perf_counter() - started
+                if not success:
+                    break
+                if number % self.stride == 0:
+                    if wanted:
+                        numbers.append(number)
+                        frames.append(frame)
+                        self.frames_read += 1
+                    sampled += 1
+                    if sampled % self.chunk_size == 0 and frames:
+                        self._put((sampled - 1) // self.chunk_size, numbers, frames)
+                        numbers, frames = [], []
+                number += 1
+            if frames:
+                self._put((sampled - 1) // self.chunk_size, numbers, frames)
+        except Exception as e:
+            self.error = e
+        finally:
+            capture.release()
+            self._put(None)
+
+    def _put(self, chunk_id, numbers=None, frames=None):
+        item = None if chunk_id is None else (chunk_id, np.array(numbers, dtype=np.int64), frames)
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def stop(self):
+        self.stopped.set()
+
+
+# ********************************** checkpoint and timeline **********************************
+def video_info(path):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"cannot open {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": int(stat.st_mtime), "fps": fps, "frame_count": frame_count}
+
+
+class Checkpoint(object):
+    # per frame results of finished chunks, written atomically so a kill never leaves a broken file
+    def __init__(self, path, signature):
+        self.path = path
+        self.signature = signature
+        self.results = {}
+        self.saved_at = time.monotonic()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        with np.load(self.path, allow_pickle=False) as saved:
+            if json.loads(str(saved["signature"])) != self.signature:
+                print(f"{self.path} belongs to another video or settings, starting over")
+                return self
+            bounds = np.cumsum(saved["chunk_sizes"])[:-1]
+            for chunk_id, numbers, counts, faces in zip(saved["chunks"], np.split(saved["frames"], bounds),
+                                                        np.split(saved["counts"], bounds), np.split(saved["faces"], bounds)):
+                self.results[int(chunk_id)] = (numbers, counts, faces)
+        return self
+
+    def add(self, chunk_id, numbers, counts, faces, every=10.0):
+        self.results[chunk_id] = (numbers, counts, faces)
+        if time.monotonic() - self.saved_at >= every:
+            self.save()
+
+    def arrays(self):
+        chunks = sorted(self.results)
+        parts = [self.results[chunk_id] for chunk_id in chunks]
+        return {
+            "chunks": np.array(chunks, dtype=np.int64),
+            "chunk_sizes": np.array([len(part[0]) for part in parts], dtype=np.int64),
+            "frames": np.concatenate([part[0] for part in parts]) if parts else np.zeros(0, dtype=np.int64),
+            "counts": np.concatenate([part[1] for part in parts]) if parts else np.zeros((0, len(EMOTIONS)), dtype=np.uint16),
+            "faces": np.concatenate([part[2] for part in parts]) if parts else np.zeros(0, dtype=np.uint16),
+        }
+
+    def save(self):
+        temporary = self.path + ".tmp.npz"
+        np.savez(temporary, signature=json.dumps(self.signature, sort_keys=True), **self.arrays())
+        os.replace(temporary, self.path)
+        self.saved_at = time.monotonic()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def timeline(frames, counts, faces, fps):
+    # one row per second of video: frames analysed, faces seen, faces per emotion and the dominant emotion
+    seconds = (frames / fps).astype(np.int64)
+    length = int(seconds.max()) + 1 if len(seconds) else 0
+    analysed = np.bincount(seconds, minlength=length).astype(np.uint32)
+    seen = np.bincount(seconds, weights=faces, minlength=length).astype(np.uint32)
+    per_emotion = np.zeros((length, len(EMOTIONS)), dtype=np.uint32)
+    np.add.at(per_emotion, seconds, counts)
+    # -1 for seconds without a classified face
+    dominant = np.where(per_emotion.any(axis=1), per_emotion.argmax(axis=1), -1).astype(np.int8)
+    return {"second": np.arange(length, dtype=np.uint32), "frames": analysed, "faces": seen, "counts": per_emotion, "dominant": dominant}
+
+
+def write_timeline(path, rows, report):
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as out:
+            writer = csv.writer(out)
+            writer.writerow(["second", "frames", "faces"] + EMOTIONS + ["dominant"])
+            for i in range(len(rows["second"])):
+                dominant = EMOTIONS[rows["dominant"][i]] if rows["dominant"][i] >= 0 else ""
+                writer.writerow([rows["second"][i], rows["frames"][i], rows["faces"][i]] + rows["counts"][i].tolist() + [dominant])
+    else:
+        np.savez_compressed(path, emotions=np.array(EMOTIONS), report=json.dumps(report), **rows)
+
+
+# ********************************** job **********************************
+def run(args):
+    info = video_info(args.video)
+    stride = max(1, int(round(info["fps"] / args.sample_fps))) if args.sample_fps else 1
+    signature = dict(info, chunk_size=args.chunk_size, stride=stride, version=CHECKPOINT_VERSION)
+    checkpoint = Checkpoint(args.output + ".partial.npz", signature).load()
+    resumed = len(checkpoint.results)
+    if resumed:
+        print(f"resuming, {resumed} chunk(s) already analysed")
+
+    workers = args.workers or os.cpu_count() or 1
+    reader = FrameReader(args.video, args.chunk_size, stride, set(checkpoint.results), depth=workers * 2)
+    started = time.perf_counter()
+    cpu_seconds = 0.0
+    analysed = 0
+
+    # tensorflow is not fork safe, workers always start from a fresh interpreter
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                                  initializer=_init_worker, initargs=(args.threads,))
+    # chunk_id -> frame numbers while the chunk is being analysed
+    pending = {}
+    futures = set()
+    try:
+        reader.start()
+        finished = False
+        while not finished or futures:
+            # keep every worker busy with one chunk and one queued behind it, no more frames than that in memory
+            while not finished and len(futures) < workers * 2:
+                try:
+                    item = reader.chunks.get(timeout=0.05 if futures else None)
+                except queue.Empty:
+                    break
+                if item is None:
+                    finished = True
+                    break
+                chunk_id, numbers, frames = item
+                pending[chunk_id] = numbers
+                futures.add(pool.submit(analyse_chunk, chunk_id, frames, args.batch_size))
+            if not futures:
+                continue
+            done, futures = concurrent.futures.wait(futures, timeout=0.5, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                chunk_id, counts, faces, seconds = future.result()
+                checkpoint.add(chunk_id, pending.pop(chunk_id), counts, faces)
+                cpu_seconds += seconds
+                analysed += len(counts)
+                if args.progress:
+                    print(f"\r{analysed} frames, {analysed / (time.perf_counter() - started):.1f} fps", end="", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("\ninterrupted, run the same command again to continue")
+        checkpoint.save()
+        raise SystemExit(130)
+    finally:
+        reader.stop()
+        pool.shutdown(wait=True, cancel_futures=True)
+    if reader.error is not None:
+        checkpoint.save()
+        raise SystemExit(f"reading {args.video} failed: {reader.error}")
+    wall_seconds = time.perf_counter() - started
+
+    arrays = checkpoint.arrays()
+    order = np.argsort(arrays["frames"], kind="stable")
+    rows = timeline(arrays["frames"][order], arrays["counts"][order], arrays["faces"][order], info["fps"])
+    report = {
+        "video": info["path"],
+        "video_fps": round(info["fps"], 3),
+        "sample_every": stride,
+        "frames_analysed": analysed,
+        "frames_resumed": int(len(arrays["frames"]) - analysed),
+        "seconds": len(rows["second"]),
+        "workers": workers,
+        "wall_seconds": round(wall_seconds, 3),
+        "decode_seconds": round(reader.decode_seconds, 3),
+        "fps": round(analysed / wall_seconds, 2) if wall_seconds else 0.0,
+        "fps_per_core": round(analysed / wall_seconds / workers, 2) if wall_seconds else 0.0,
+        "fps_per_cpu_second": round(analysed / cpu_seconds, 2) if cpu_seconds else 0.0,
+    }
+    write_timeline(args.output, rows, report)
+    checkpoint.remove()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MedIQ Advisor offline video emotion analysis")
+    parser.add_argument("video", help="recorded session, anything cv2.VideoCapture can open")
+    parser.add_argument("-o", "--output", help="timeline file, .npz or .csv (default: <video>.emotions.npz)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: one per cpu)")
+    parser.add_argument("--threads", type=int, default=1, help="opencv/tensorflow threads inside each worker")
+    parser.add_argument("--chunk-size", type=int, default=64, help="frames per chunk handed to a worker")
+    parser.add_argument("--batch-size", type=int, default=16, help="frames whose faces are classified in one predict call")
+    parser.add_argument("--sample-fps", type=float, default=0, help="analyse only this many frames per second of video")
+    parser.add_argument("--progress", action="store_true", help="print frames per second while running")
+    args = parser.parse_args()
+    args.output = args.output or os.path.splitext(args.video)[0] + ".emotions.npz"
+
+    # a terminated job checkpoints and stops its workers the same way as Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    report = run(args)
+    if args.progress:
+        print(file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+# One module per blueprint. Each has a Blueprint named bp, uses_db, and init_app(app), which
+# registers the blueprint and loads whatever the blueprint needs. factory.create_app imports only
+# the modules of its role, so a web process never imports the ML libraries.
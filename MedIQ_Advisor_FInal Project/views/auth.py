@@ -0,0 +1,264 @@
+from flask import Blueprint, render_template, request, flash, redirect, session
+import os
+import re  # Import regular expression module for username and email validation
+import smtplib
+from email.message import EmailMessage
+
+import admission
+import metrics
+from extensions import db, limiter
+from models import User
+
+bp = Blueprint('auth', __name__)
+uses_db = True
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+
+
+# Define regular expression patterns for name, username, email, and password validation
+name_pattern = re.compile(r'^[a-zA-Z\s]{1,40}$')
+username_pattern = re.compile(r'^[a-z0-9_.]{6,}$')
+email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@(?:gmail|yahoo|outlook)\.com$')
+mobile_no_pattern = re.compile(r'^\d{10}$')
+password_pattern = re.compile(r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{8,}$')
+
+
+# Sign up page
+@bp.route('/signup',  methods=['GET', 'POST']) # Accept both GET and POST requests
+def signup():
+    if request.method == 'POST':
+        fullName = request.form['fullName']
+        gender = request.form['gender']
+        age = request.form['age']
+        username = request.form['username']
+        email = request.form['email']
+        mobile_no = request.form['mobile_no']
+        city = request.form['city']
+        emergency_contact = request.form['emergency_contact']
+        concern = request.form['concern']
+        password = request.form['password']
+
+        # Check if the full name meets the criteria
+        if not name_pattern.match(fullName):
+            flash('Full name must be between 1 and 40 characters long and contain only letters.', 'error')
+            return redirect('/signup')
+        
+        # Check if the gender is valid
+        if gender not in ['male', 'female']:
+            flash('Gender must be either "male" or "female".', 'error')
+            return redirect('/signup')
+        
+        # Check if the age is valid
+        try:
+            age = int(age)
+            if age < 18 or age > 100:  # Assuming valid age range is between 18 and 100
+                raise ValueError
+        except ValueError:
+            flash('Age must be a number between 18 and 100.', 'error')
+            return redirect('/signup')
+        
+        # Check if the username meets the criteria
+        if not username_pattern.match(username):
+            flash('Username must contain at least 6 characters and can only contain letters (in small-case only), numbers (0 to 9), underscore (_), and period (.)', 'error')
+            return redirect('/signup')
+        
+         # Check if the email meets the criteria
+        if not email_pattern.match(email):
+            flash('Email must be in a valid format (@gmail.com, @yahoo.com, @outlook.com, etc.)', 'error')
+            return redirect('/signup')
+        
+        # Check if the mobile number is valid
+        if not mobile_no_pattern.match(mobile_no):
+            flash('Mobile number must be a 10-digit number.', 'error')
+            return redirect('/signup')
+        
+        # Check if the city is provided and meets the criteria
+        if not city:
+            flash('City field is required.', 'error')
+            return redirect('/signup')
+        
+        # Check if the emergency contact is valid
+        if not mobile_no_pattern.match(emergency_contact):
+            flash('Emergency contact must be a 10-digit number.', 'error')
+            return redirect('/signup')
+        
+        # Check if the concern field meets the criteria (if provided)
+        if concern and len(concern) > 200:  # Assuming maximum length of concern is 200 characters
+            flash('Concern must be less than or equal to 200 characters.', 'error')
+            return redirect('/signup')
+       
+        # Check if the password meets the criteria
+        if not password_pattern.match(password):
+            flash('Password must contain at least 8 characters, 1 capital letter, 1 small letter, and 1 symbol.', 'error')
+            return redirect('/signup')
+
+        # Check if the username or email already exists
+        if User.query.filter_by(username=username).first() is not None:
+            flash('User already exists! Choose a different username.', 'error')
+            return redirect('/signup')
+        elif User.query.filter_by(email=email).first() is not None:
+            flash('Email already exists! Use a different email address.', 'error')
+            return redirect('/signup')
+
+        # If all validation passes, create a new user
+        new_user = User(fullName=fullName, gender=gender, age=age, username=username, email=email, mobile_no=mobile_no, city=city, emergency_contact=emergency_contact, concern=concern, password=password)
+        db.session.add(new_user)
+        db.session.commit()
+
+        flash('Registration successful. Now, you can sign in.', 'success')
+        return redirect('/signup')
+
+    # If it's a GET request, just render the signup form
+    return render_template('signup.html')
+
+
+# Sign in page 
+@bp.route('/signin', methods=['GET', 'POST'])
+def signin():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+
+        # Find user by username
+        user = User.query.filter_by(username=username).first()
+
+        if user:
+            # Check if the password matches
+            if user.password == password:
+                # the signed session cookie is what history is recorded against, in every role
+                session['user_id'] = user.id
+                flash('Sign-in successful!', 'success')
+                return redirect('/home')
+            else:
+                flash('Incorrect password. Please try again.', 'error')
+                return redirect('/signin')  # Redirect after flashing error message
+        else:
+            flash('User not found. Please sign up first.', 'error')
+            return redirect('/signup')
+
+    return render_template('signin.html')
+
+
+# SMTP server, overridable so benchmarks can point it at a local stub
+smtp_host = os.environ.get('MEDIQ_SMTP_HOST', 'smtp.gmail.com')
+smtp_port = int(os.environ.get('MEDIQ_SMTP_PORT', '587'))
+smtp_tls = os.environ.get('MEDIQ_SMTP_TLS', '1') == '1'
+
+
+# Function to send email for password reset
+def send_password_reset_email(username, email, new_password):
+    # Email content
+    subject = "Password Reset Request"
+    body = f"Hello {username},\n\nYour password has been successfully reset. Your new password is: {new_password}\n\nIf you didn't request this change, please contact us immediately."
+    to = email
+
+    # Email configuration
+    msg = EmailMessage()
+    msg.set_content(body)
+    msg['subject'] = subject
+    msg['to'] = to
+
+    user = "himanshu.m1802@gmail.com"  # Update with your email
+    msg['from'] = user
+    password = "anshu1802"  # Update with your email password
+
+    # Sending the email
+    try:
+        with metrics.SMTP_SECONDS.time():
+            server = smtplib.SMTP(smtp_host, smtp_port)
+            if smtp_tls:
+                server.starttls()
+            server.login(user, password)
+            server.send_message(msg)
+            server.quit()
+    except Exception:
+        metrics.SMTP_FAILURES.inc()
+        raise
+
+
+# three reset mails per account, one more every 20 minutes
+reset_quota = ("forgot_password_user", 0.05, 3)
+
+
+# Update the update_password() function to include sending email
+@bp.route('/forgotpassword', methods=['GET', 'POST'])
+@limiter.limit("forgot_password", per_minute=5, methods=("POST",))
+def update_password():
+    if request.method == 'POST':
+        username = request.form['username']
+        email = request.form['email']
+        new_password = request.form['password']
+
+        # Check if the username and email match the user
+        user = User.query.filter_by(username=username, email=email).first()
+
+        if user:
+            # only resets that go through count against the user's quota, so strangers who merely know
+            # the username cannot use it up
+            try:
+                allowed, retry_after = limiter.take(*reset_quota, user.username)
+            except admission.StoreBusy:
+                return admission.rejection(503, 1, 'Server is busy, please try again shortly.')
+            if not allowed:
+                return admission.rejection(429, retry_after, 'Too many password resets for this account, please try again later.')
+            # Update the password
+            user.password = new_password
+            db.session.commit()
+            # Send password reset email, the quota is given back when no mail went out
+            try:
+                send_password_reset_email(username, email, new_password)
+            except Exception:
+                try:
+                    limiter.refund(*reset_quota, user.username)
+                except admission.StoreBusy:
+                    pass
+                raise
+            flash('Password updated successfully! Check your email for confirmation.', 'success')
+        else:
+            flash('Username or email did not match. Check either of them before trying again.', 'error')
+    
+    return render_template('forgotpassword.html')
+
+# Forgot password page
+# @bp.route('/forgotpassword', methods=['GET', 'POST'])
+# def update_password():
+#     if request.method == 'POST':
+#         username = request.form['username']
+#         email = request.form['email']
+#         new_password = request.form['password']
+
+#         # Check if the password meets the criteria
+#         if not password_pattern.match(new_password):
+#             flash('Password must contain at least 8 characters, 1 capital letter, 1 small letter, and 1 symbol.', 'error')
+#             return redirect('/forgotpassword')
+
+#         # Check if the username and email match the user
+#         user = User.query.filter_by(username=username, email=email).first()
+
+#         if user:
+#             # Update the password
+#             user.password = new_password
+#             db.session.commit()
+#             flash('Password updated successfully!', 'success')
+#         else:
+#             flash('Username or email did not match. Check either of them before trying again.', 'error')
+    
+#     return render_template('forgotpassword.html')
+
+
+# ********************************** old MedIQ_Advisor-flask addresses **********************************
+@bp.route('/sign_up')
+def sign_up():
+    return redirect('/signup', code=301)
+
+
+@bp.route('/sign_in')
+def sign_in():
+    return redirect('/signin', code=301)
+
+
+@bp.route('/forgot_password')
+def forgot_password():
+    return redirect('/forgotpassword', code=301)
@@ -0,0 +1,14 @@
+from flask import Blueprint, render_template
+
+bp = Blueprint('chat', __name__)
+uses_db = False
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+
+
+# Chatbot page
+@bp.route('/chatbot')
+def chatbot():
+    return render_template('chatbot.html')
@@ -0,0 +1,147 @@
+from flask import Blueprint, render_template, request, flash, redirect
+
+from extensions import db
+from models import ContactMessage
+from views.history import record
+
+bp = Blueprint('content', __name__)
+uses_db = True
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+
+
+@bp.route('/')
+def index():
+    return render_template('index.html')
+
+
+# Home page
+@bp.route('/home', methods=['POST', 'GET'])
+def home():
+    if request.method == "POST":
+        name = request.form["name"]
+        email = request.form["email"]
+        subject = request.form["subject"]
+        message = request.form["message"]
+
+        new_message = ContactMessage(name=name, email=email, subject=subject, message=message)
+        db.session.add(new_message)
+        db.session.commit()
+
+        flash('Your message has been sent successfully!', 'success')
+
+        return redirect("/home")
+
+    return render_template('home.html')
+
+
+# Emotion detection page
+@bp.route('/emotiondetection')
+def emotiondetection():
+    return render_template('emotiondetection.html')
+
+
+# Define the route to handle form submission
+@bp.route('/submit_form', methods=['POST', 'GET'])
+def submit_form():
+    # Get the random number passed from the JavaScript function
+    random_number = float(request.form['randomNumber'])
+
+    # Determine the route based on the random number
+    if 0.0 <= random_number < 0.1:
+        return questionnaire_outcome('emotion_questionnaire_response1_1', random_number=random_number)
+    elif 0.1 <= random_number < 0.2:
+        return questionnaire_outcome('emotion_questionnaire_response1_2', random_number=random_number)
+    elif 0.2 <= random_number < 0.3:
+        return questionnaire_outcome('emotion_questionnaire_response1_3', random_number=random_number)
+    elif 0.3 <= random_number < 0.4:
+        return questionnaire_outcome('emotion_questionnaire_response1_4', random_number=random_number)
+    elif 0.4 <= random_number < 0.5:
+        return questionnaire_outcome('emotion_questionnaire_response1_5', random_number=random_number)
+    elif 0.5 <= random_number < 0.6:
+        return questionnaire_outcome('emotion_questionnaire_response2_1', random_number=random_number)
+    elif 0.6 <= random_number < 0.7:
+        return questionnaire_outcome('emotion_questionnaire_response2_2', random_number=random_number)
+    elif 0.7 <= random_number < 0.8:
+        return questionnaire_outcome('emotion_questionnaire_response2_3', random_number=random_number)
+    elif 0.8 <= random_number < 0.9:
+        return questionnaire_outcome('emotion_questionnaire_response2_4', random_number=random_number)
+    else:
+        return questionnaire_outcome('emotion_questionnaire_response2_5', random_number=random_number)
+
+
+def questionnaire_outcome(outcome, **context):
+    # the questionnaire form posts its answers straight to the response page it picked
+    if request.method == 'POST':
+        record('questionnaire', outcome, payload={name: value for name, value in request.form.items() if name != 'randomNumber'})
+    return render_template(outcome + '.html', **context)
+
+
+@bp.route('/emotion_questionnaire_response1_1', methods=['POST', 'GET'])
+def emotion_questionnaire_response1_1():
+    return questionnaire_outcome('emotion_questionnaire_response1_1')
+
+@bp.route('/emotion_questionnaire_response1_2', methods=['POST', 'GET'])
+def emotion_questionnaire_response1_2():
+    return questionnaire_outcome('emotion_questionnaire_response1_2')
+
+@bp.route('/emotion_questionnaire_response1_3', methods=['POST', 'GET'])
+def emotion_questionnaire_response1_3():
+    return questionnaire_outcome('emotion_questionnaire_response1_3')
+
+@bp.route('/emotion_questionnaire_response1_4', methods=['POST', 'GET'])
+def emotion_questionnaire_response1_4():
+    return questionnaire_outcome('emotion_questionnaire_response1_4')
+
+@bp.route('/emotion_questionnaire_response1_5', methods=['POST', 'GET'])
+def emotion_questionnaire_response1_5():
+    return questionnaire_outcome('emotion_questionnaire_response1_5')
+
+@bp.route('/emotion_questionnaire_response2_1', methods=['POST', 'GET'])
+def emotion_questionnaire_response2_1():
+    return questionnaire_outcome('emotion_questionnaire_response2_1')
+
+@bp.route('/emotion_questionnaire_response2_2', methods=['POST', 'GET'])
+def emotion_questionnaire_response2_2():
+    return questionnaire_outcome('emotion_questionnaire_response2_2')
+
+@bp.route('/emotion_questionnaire_response2_3', methods=['POST', 'GET'])
+def emotion_questionnaire_response2_3():
+    return questionnaire_outcome('emotion_questionnaire_response2_3')
+
+@bp.route('/emotion_questionnaire_response2_4', methods=['POST', 'GET'])
+def emotion_questionnaire_response2_4():
+    return questionnaire_outcome('emotion_questionnaire_response2_4')
+
+@bp.route('/emotion_questionnaire_response2_5', methods=['POST', 'GET'])
+def emotion_questionnaire_response2_5():
+    return questionnaire_outcome('emotion_questionnaire_response2_5')
+
+
+@bp.route('/emotion_questionnaire', methods=['POST','GET'])
+def emotion_questionnaire():
+    return render_template('emotion_questionnaire.html')
+
+
+# ********************************** old MedIQ_Advisor-flask addresses **********************************
+@bp.route('/contact_us')
+def contact_us():
+    return redirect('/home', code=301)
+
+
+@bp.route('/emotion_detection')
+def emotion_detection():
+    return redirect('/emotiondetection', code=301)
+
+
+@bp.route('/about_us')
+def about_us():
+    return redirect('/home#about', code=301)
+
+
+# the voice assistant is the eel app of "Virtual Assistance-final project", home.html links it the same way
+@bp.route('/voice_assistant')
+def voice_assistant():
+    return redirect('http://localhost:8000/index.html', code=302)
@@ -0,0 +1,120 @@
+from flask import Blueprint, Response, session
+import atexit
+import collections
+import os
+import threading
+import time
+
+import cv2
+
+import metrics
+from extensions import history_log, inference_cap, limiter, stream_cap
+from inference import InferencePool, detect_emotions, draw_emotions, load_emotion_model, load_face_cascade
+
+bp = Blueprint('emotion', __name__)
+uses_db = False
+
+# Loaded by init_app, only processes serving this blueprint pay for the models
+classifier = None
+face_cascade = None
+
+
+def init_app(app):
+    global classifier, face_cascade
+    # Load model architecture and weights
+    classifier = load_emotion_model()
+
+    # Load face cascade
+    try:
+        face_cascade = load_face_cascade()
+    except Exception as e:
+        print("Error loading cascade classifiers:", e)
+    app.register_blueprint(bp)
+
+
+# ********************************** inference worker pool **********************************
+# With MEDIQ_INFERENCE_WORKERS > 0 the models run in worker processes so that inference does not
+# hold the GIL of the request threads. The pool starts on first use: spawned workers import the
+# main module again when it is run directly and must not start pools of their own.
+inference_workers = int(os.environ.get('MEDIQ_INFERENCE_WORKERS', '0'))
+inference_timeout = float(os.environ.get('MEDIQ_INFERENCE_TIMEOUT', '2.0'))
+inference_pool = None
+inference_pool_lock = threading.Lock()
+
+
+def get_inference_pool():
+    global inference_pool
+    if inference_workers <= 0:
+        return None
+    with inference_pool_lock:
+        if inference_pool is None:
+            inference_pool = InferencePool(workers=inference_workers, timeout=inference_timeout)
+            atexit.register(inference_pool.close)
+        return inference_pool
+
+
+class VideoCamera(object):
+    def __init__(self):
+        self.video = cv2.VideoCapture(0)
+        self.start_time = time.time()
+        # what the stream saw, recorded as the session summary once it ends
+        self.frames = 0
+        self.emotions = collections.Counter()
+
+    def __del__(self):
+        self.video.release()
+
+    def get_frame(self):
+        current_time = time.time()
+        elapsed_time = current_time - self.start_time
+        if elapsed_time >= 5:
+            return None
+
+        success, frame = self.video.read()
+        if not success:
+            return None
+
+        # when too many inference jobs are running the frame is streamed without labels
+        detections = []
+        if inference_cap.try_acquire():
+            try:
+                pool = get_inference_pool()
+                if pool is not None:
+                    # None when every worker is busy
+                    detections = pool.detect_emotions(frame) or []
+                else:
+                    detections = detect_emotions(face_cascade, classifier, frame)
+            finally:
+                inference_cap.release()
+        self.frames += 1
+        self.emotions.update(label for (x, y, w, h, label) in detections if label)
+        draw_emotions(frame, detections)
+
+        with metrics.FRAME_ENCODE_SECONDS.time():
+            ret, jpeg = cv2.imencode('.jpg', frame)
+        return jpeg.tobytes()
+
+
+# ********************************** Due to emotion detection **********************************
+def gen(camera, user_id=None):
+    try:
+        while True:
+            frame = camera.get_frame()
+            if frame is None:
+                break
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n\r\n')
+    finally:
+        # also when the browser left early; the dominant emotion is the label the daily counts go by
+        if camera.frames:
+            dominant = camera.emotions.most_common(1)[0][0] if camera.emotions else 'no_face'
+            history_log.append(user_id, 'emotion', dominant, camera.frames,
+                               {'frames': camera.frames, 'seconds': round(time.time() - camera.start_time, 1),
+                                'emotions': dict(camera.emotions)})
+
+
+@bp.route('/video_feed_emotion')
+@limiter.limit("video_feed", per_minute=6)
+@limiter.cap(stream_cap)
+def video_feed_emotion():
+    return Response(gen(VideoCamera(), session.get('user_id')), mimetype='multipart/x-mixed-replace; boundary=frame')
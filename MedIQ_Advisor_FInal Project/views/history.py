@@ -0,0 +1,76 @@
+from datetime import date
+
+from flask import Blueprint, request, jsonify, session
+
+import history
+from extensions import history_log, limiter
+
+bp = Blueprint('history', __name__)
+uses_db = False
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+
+
+def current_user_id():
+    return session.get('user_id')
+
+
+def record(kind, label=None, value=None, payload=None):
+    # queued for the signed-in user, visitors who did not sign in are not recorded
+    return history_log.append(current_user_id(), kind, label, value, payload)
+
+
+def signed_in_only():
+    if current_user_id() is None:
+        return jsonify({'error': 'sign in to see your history'}), 401
+    return None
+
+
+# A chat turn, sent by chatbot.js after it answered; the answers themselves come from the page
+@bp.route('/history/chat', methods=['POST'])
+@limiter.limit("history_chat", per_minute=120)
+def history_chat():
+    denied = signed_in_only()
+    if denied:
+        return denied
+    message = request.form.get('message', '')[:1000]
+    if not message.strip():
+        return jsonify({'error': 'message is empty'}), 400
+    topic = request.form.get('topic', '').strip().lower()[:80] or 'unanswered'
+    record('chat', topic, payload={'message': message, 'reply': request.form.get('reply', '')[:4000]})
+    return '', 204
+
+
+# Timeline of the signed-in user, newest first, e.g. /history?kind=emotion&limit=50
+# next in the answer is passed back as before= for the following page
+@bp.route('/history')
+def history_timeline():
+    denied = signed_in_only()
+    if denied:
+        return denied
+    try:
+        page = history_log.timeline(current_user_id(), before=request.args.get('before'),
+                                    limit=request.args.get('limit', 20, type=int), kinds=request.args.getlist('kind'))
+    except history.HistoryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+
+# Per day counts for the dashboard charts, e.g. /history/daily?days=90&until=2024-06-30
+@bp.route('/history/daily')
+def history_daily():
+    denied = signed_in_only()
+    if denied:
+        return denied
+    try:
+        until = date.fromisoformat(request.args['until']) if 'until' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'until must be a date like 2024-06-30'}), 400
+    try:
+        rollup = history_log.daily(current_user_id(), days=request.args.get('days', 30, type=int), until=until,
+                                   kinds=request.args.getlist('kind'))
+    except history.HistoryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(rollup)
@@ -0,0 +1,90 @@
+from flask import Blueprint, request, jsonify
+import os
+import threading
+
+import admission
+import analytics
+import screening
+from extensions import inference_cap, limiter
+from inference import load_screening_model
+from views.emotion import get_inference_pool
+
+bp = Blueprint('screening', __name__)
+uses_db = False
+
+# Loaded by init_app
+loaded_model = None
+screening_categories = None
+
+
+def init_app(app):
+    global loaded_model, screening_categories
+    # Load screening model
+    loaded_model = load_screening_model()
+    # Answer encoding of the model, rebuilt from the survey it was trained on
+    screening_categories = screening.fit_categories(screening.load_survey())
+    app.register_blueprint(bp)
+
+
+# ********************************** survey analytics **********************************
+# Columnar cache of survey.csv, built on first use and again only when the csv changes
+survey_store = None
+survey_store_lock = threading.Lock()
+
+
+def get_survey_store():
+    global survey_store
+    with survey_store_lock:
+        if survey_store is None:
+            survey_store = analytics.SurveyStore(cache_dir=os.environ.get('MEDIQ_ANALYTICS_CACHE', analytics.CACHE_DIR))
+        return survey_store
+
+
+# Screening score for the 21 survey answers, posted as form fields named like the survey columns
+@bp.route('/screening_score', methods=['POST'])
+@limiter.limit("screening", per_minute=60)
+def screening_score():
+    answers = {column: request.form.get(column, '').strip() for column in screening.FEATURE_COLUMNS}
+    try:
+        features = screening.encode([answers], screening_categories)
+    except screening.AnswerError as e:
+        # the answers the model knows are sent back for every unknown one
+        return jsonify({'error': str(e), 'missing': e.missing,
+                        'unknown': {column: sorted(screening_categories[column]) for column in e.unknown}}), 400
+
+    if not inference_cap.try_acquire():
+        return admission.rejection(503, 1, 'Screening is busy, please try again.')
+    try:
+        pool = get_inference_pool()
+        if pool is not None:
+            scores = pool.screening_scores(features)
+            if scores is None:
+                return admission.rejection(503, 1, 'Screening is busy, please try again.')
+            score = scores[0]
+        else:
+            score = float(screening.screening_scores(loaded_model, features)[0])
+    finally:
+        inference_cap.release()
+
+    return jsonify({'score': round(score, 4)})
+
+
+# Survey aggregates, e.g. /analytics/rate?by=no_employees&Gender=Female
+# by can be repeated up to 3 times, target/value pick the answer that is counted (treatment=Yes by default),
+# every other argument named like a survey column filters the respondents
+@bp.route('/analytics/rate')
+@limiter.limit("analytics", per_minute=60)
+def analytics_rate():
+    store = get_survey_store()
+    by = request.args.getlist('by')
+    where = [(name, request.args.getlist(name)) for name in sorted(request.args) if name not in ('by', 'target', 'value')]
+    try:
+        result = store.rate(by, request.args.get('target', 'treatment'), request.args.get('value', 'Yes'), where)
+    except analytics.QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+
+@bp.route('/analytics/columns')
+def analytics_columns():
+    return jsonify(get_survey_store().describe())
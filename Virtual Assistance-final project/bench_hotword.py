@@ -0,0 +1,42 @@
+import struct
+import sys
+import time
+import wave
+
+from engine.hotword import HotwordListener, PorcupineDetector, WavSource
+
+
+def legacy(path):
+    # the old loop: struct format string and a python tuple for every frame
+    detector = PorcupineDetector()
+    frames = 0
+    started = time.process_time()
+    with wave.open(path, "rb") as wav:
+        while True:
+            data = wav.readframes(detector.frame_length)
+            if len(data) < detector.frame_length * 2:
+                break
+            keyword = struct.unpack_from("h"*detector.frame_length, data)
+            detector.process(keyword)
+            frames += 1
+    cpu_seconds = time.process_time() - started
+    detector.delete()
+    audio_seconds = frames * detector.frame_length / detector.sample_rate
+    return {"frames": frames, "cpu_seconds": round(cpu_seconds, 3), "cpu_seconds_per_minute": round(cpu_seconds * 60 / audio_seconds, 3)}
+
+
+def current(path):
+    source = WavSource(path)
+    listener = HotwordListener(PorcupineDetector(), source)
+    listener.start()
+    source.finished.wait()
+    report = listener.report()
+    listener.stop()
+    return report
+
+
+# python bench_hotword.py recording.wav  (mono, 16-bit, 16 kHz)
+if __name__ == '__main__':
+    path = sys.argv[1]
+    print("before:", legacy(path))
+    print("after: ", current(path))
@@ -0,0 +1,62 @@
+import statistics
+import time
+
+from engine.intents import router
+
+# utterances as they come out of the recognizer, with the intent they should reach
+CORPUS = [
+    ("open chrome", "open"),
+    ("open the notepad app", "open"),
+    ("jarvis open vs code", "open"),
+    ("opens spotify", "open"),
+    ("play believer on youtube", "youtube"),
+    ("play lofi beats on you tube", "youtube"),
+    ("play arijit singh songs on youtub", "youtube"),
+    ("send message to pawan", "contact"),
+    ("send massage to kunal", "contact"),
+    ("phone call rahul", "contact"),
+    ("make a phone cal to mom", "contact"),
+    ("video call dad", "contact"),
+    ("video kall to harshal", "contact"),
+    ("what is the capital of india", "chat"),
+    ("tell me a joke", "chat"),
+    ("how do i lower my blood pressure", "chat"),
+    ("what should i eat for dinner", "chat"),
+    ("i feel anxious today", "chat"),
+]
+
+
+def evaluate(rounds=200):
+    router.compile()
+
+    correct = 0
+    for utterance, expected in CORPUS:
+        intent = router.parse(utterance)
+        ok = intent is not None and intent.name == expected
+        correct += ok
+        if not ok:
+            print(f"MISS {utterance!r}: expected {expected}, got {intent}")
+
+    # handlers are swapped for no-ops so only routing and bookkeeping are timed
+    handlers = [(route, route.handler) for route in router.routes + [router.fallback_route]]
+    for route, _ in handlers:
+        route.handler = lambda intent: None
+
+    samples = []
+    try:
+        for _ in range(rounds):
+            for utterance, _ in CORPUS:
+                started = time.perf_counter()
+                router.dispatch(utterance)
+                samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        for route, handler in handlers:
+            route.handler = handler
+
+    samples.sort()
+    print(f"accuracy: {correct}/{len(CORPUS)} ({100.0 * correct / len(CORPUS):.1f}%)")
+    print(f"dispatch: mean {statistics.mean(samples):.3f} ms, p50 {samples[len(samples) // 2]:.3f} ms, p99 {samples[int(len(samples) * 0.99)]:.3f} ms")
+
+
+if __name__ == '__main__':
+    evaluate()
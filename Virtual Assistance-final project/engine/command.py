@@ -1,9 +1,34 @@
 import pyttsx3
-import speech_recognition as sr
 import eel
 import time
+
+from engine.recognition import get_pipeline
+from engine.router import router
+
+# event bus of the supervisor, None when the engine runs in a single process
+bus = None
+last_hotword = None
+
+
+def attachBus(event_bus):
+    global bus
+    bus = event_bus
+
+
+def markHotword(event):
+    global last_hotword
+    last_hotword = event
+
+
 def speak(text):
     text = str(text)
+    if bus is not None:
+        # the tts worker keeps one engine alive, wait for it so asr does not hear the answer
+        eel.DisplayMessage(text)
+        eel.receiverText(text)
+        bus.request("tts", text, timeout=60, sleep=eel.sleep)
+        return
+
     engine = pyttsx3.init('sapi5')
     voices = engine.getProperty('voices') 
     engine.setProperty('voice', voices[0].id)
@@ -16,29 +41,53 @@ def speak(text):
 
 def takecommand():
 
-    r = sr.Recognizer()
-
-    with sr.Microphone() as source:
+    if bus is not None:
         print('Listening....')
         eel.DisplayMessage('listening....')
-        r.pause_threshold = 1
-        r.adjust_for_ambient_noise(source)
-        
-        audio = r.listen(source, 10, 6)
+        try:
+            query = bus.request("asr", {"timeout": 10}, timeout=30, sleep=eel.sleep)
+        except (RuntimeError, TimeoutError) as e:
+            print(e)
+            return ""
+        if query:
+            print(f"user said: {query}")
+            eel.DisplayMessage(query)
+        return query
 
+    pipeline = get_pipeline()
+
+    # a missing microphone or recognizer backend must not leave the ui in listening mode
     try:
+        print('Listening....')
+        eel.DisplayMessage('listening....')
+        audio = pipeline.listen(timeout=10)
+        if audio is None:
+            return ""
+
         print('recognizing')
         eel.DisplayMessage('recognizing....')
-        query = r.recognize_google(audio, language='en-in')
-        print(f"user said: {query}")
-        eel.DisplayMessage(query)
-        time.sleep(2)
-       
+        query = pipeline.recognize(audio)
     except Exception as e:
+        print(e)
+        return ""
+    if not query:
         return ""
-    
+
+    print(f"user said: {query}")
+    eel.DisplayMessage(query)
+
     return query.lower()
 
+
+@eel.expose
+def recognitionStats():
+    return get_pipeline().stats()
+
+@eel.expose
+def routerStats():
+    return router.snapshot()
+
+
 @eel.expose
 def allCommands(message=1):
 
@@ -49,36 +98,13 @@ def allCommands(message=1):
     else:
         query = message
         eel.senderText(query)
-    try:
 
-        if "open" in query:
-            from engine.features import openCommand
-            openCommand(query)
-        elif "on youtube" in query:
-            from engine.features import PlayYoutube
-            PlayYoutube(query)
-        
-        elif "send message" in query or "phone call" in query or "video call" in query:
-            from engine.features import findContact, whatsApp
-            flag = ""
-            contact_no, name = findContact(query)
-            if(contact_no != 0):
-
-                if "send message" in query:
-                    flag = 'message'
-                    speak("what message to send")
-                    query = takecommand()
-                    
-                elif "phone call" in query:
-                    flag = 'call'
-                else:
-                    flag = 'video call'
-                    
-                whatsApp(contact_no, query, flag, name)
-        else:
-            from engine.features import chatBot
-            chatBot(query)
-    except:
-        print("error")
-    
+    intent = router.dispatch(query)
+
     eel.ShowHood()
+
+    if last_hotword is not None and bus is not None:
+        elapsed = (time.time() - last_hotword["time"]) * 1000
+        print(f"hotword to response: {elapsed:.0f} ms")
+        bus.status("ui", "response", ms=round(elapsed))
+        markHotword(None)
@@ -1,7 +1,8 @@
-import csv
-import sqlite3
+import sys
 
-con = sqlite3.connect("jarvis.db")
+from engine.lookup import ensure_schema, get_connection, import_contacts_csv
+
+con = get_connection()
 cursor = con.cursor()
 
 query = "CREATE TABLE IF NOT EXISTS sys_command(id integer primary key, name VARCHAR(100), path VARCHAR(1000))"
@@ -29,20 +30,17 @@ cursor.execute(query)
 cursor.execute('''CREATE TABLE IF NOT EXISTS contacts (id integer primary key, name VARCHAR(200), mobile_no VARCHAR(255), email VARCHAR(255) NULL)''')
 
 
-# Specify the column indices you want to import (0-based index)
-# Example: Importing the 1st and 3rd columns
-# desired_columns_indices = [0, 30]
+# Normalized name columns, name indexes and change triggers used by engine.lookup
+ensure_schema(con)
 
-# # Read data from CSV and insert into SQLite table for the desired columns
-# with open('contacts.csv', 'r', encoding='utf-8') as csvfile:
-#     csvreader = csv.reader(csvfile)
-#     for row in csvreader:
-#         selected_data = [row[i] for i in desired_columns_indices]
-#         cursor.execute(''' INSERT INTO contacts (id, 'name', 'mobile_no') VALUES (null, ?, ?);''', tuple(selected_data))
 
-# # Commit changes and close connection
-# con.commit()
-# con.close()
+# Bulk import contacts from a csv export: python -m engine.db contacts.csv
+# Columns are the 0-based indices of the name and the mobile number (google contacts: 0 and 30)
+desired_columns_indices = [0, 30]
+
+if __name__ == '__main__' and len(sys.argv) > 1:
+    imported = import_contacts_csv(sys.argv[1], desired_columns_indices)
+    print(f"imported {imported} contacts")
 
 # query = "INSERT INTO contacts VALUES (null,'pawan', '1234567890', 'null')"
 # cursor.execute(query)
@@ -1,21 +1,18 @@
+import os
 from pipes import quote
 import re
-import sqlite3
-import struct
 import time
+import webbrowser
 from playsound import playsound
 import eel
-import pyaudio
+from engine import command
 from engine.command import speak
-# Playing assiatnt sound function
-import pywhatkit as kit
-import pvporcupine
 
-from engine.helper import extract_yt_term, remove_words
-from hugchat import hugchat
+from engine.helper import remove_words
+from engine.lookup import find_app, find_contact, find_website
 
-con = sqlite3.connect("jarvis.db")
-cursor = con.cursor()
+# The ui process imports this module; pywhatkit and hugchat are imported where they are used, and the
+# hotword listener lives in engine.workers, so the ui does not load the chat or hotword stacks.
 
 @eel.expose
 def playAssistantSound():
@@ -23,53 +20,64 @@ def playAssistantSound():
     playsound(music_dir)
        
 
-def PlayYoutube(query):
-    search_term = extract_yt_term(query)
-    speak("Playing "+search_term+" on YouTube")
-    kit.playonyt(search_term)
+def openCommand(query):
+    app_name = remove_words(query, ["open", "jarvis"]).strip()
+    if app_name == "":
+        return
 
+    # saved applications first, then saved websites, then let windows try the name itself
+    app = find_app(app_name)
+    if app is not None:
+        speak("Opening "+app[0])
+        os.startfile(app[1])
+        return
 
-def hotword():
-    porcupine=None
-    paud=None
-    audio_stream=None
+    website = find_website(app_name)
+    if website is not None:
+        speak("Opening "+website[0])
+        webbrowser.open(website[1])
+        return
+
+    # startfile hands the name to the windows shell as one argument, typed text cannot chain commands
+    speak("Opening "+app_name)
     try:
-       
-        # pre trained keywords    
-        porcupine=pvporcupine.create(keywords=["bob","alexa"]) 
-        paud=pyaudio.PyAudio()
-        audio_stream=paud.open(rate=porcupine.sample_rate,channels=1,format=pyaudio.paInt16,input=True,frames_per_buffer=porcupine.frame_length)
-        
-        # loop for streaming
-        while True:
-            keyword=audio_stream.read(porcupine.frame_length)
-            keyword=struct.unpack_from("h"*porcupine.frame_length,keyword)
-
-            # processing keyword comes from mic 
-            keyword_index=porcupine.process(keyword)
-
-            # checking first keyword detetcted for not
-            if keyword_index>=0:
-                print("hotword detected")
-
-                # pressing shorcut key win+j
-                import pyautogui as autogui
-                autogui.keyDown("win")
-                autogui.press("b")
-                time.sleep(2)
-                autogui.keyUp("win")
-                
-    except:
-        if porcupine is not None:
-            porcupine.delete()
-        if audio_stream is not None:
-            audio_stream.close()
-        if paud is not None:
-            paud.terminate()
+        os.startfile(app_name)
+    except OSError:
+        speak("not found")
+
+
+def findContact(query):
+    contact = find_contact(query)
+    if contact is None:
+        speak('not exist in contacts')
+        return 0, 0
+
+    name, mobile_number_str = contact
+    mobile_number_str = str(mobile_number_str)
+    if not mobile_number_str.startswith('+91'):
+        mobile_number_str = '+91' + mobile_number_str
+    return mobile_number_str, name
+
+
+def PlayYoutube(search_term):
+    # the router's youtube intent has already cut the search term out of the command
+    import pywhatkit as kit
+
+    speak("Playing "+search_term+" on YouTube")
+    kit.playonyt(search_term)
+
 
 # chat bot 
 def chatBot(query):
     user_input = query.lower()
+    if command.bus is not None:
+        response = command.bus.request("chat", user_input, timeout=120, sleep=eel.sleep)
+        print(response)
+        speak(response)
+        return response
+    # without the supervisor there is no chat worker, hugchat runs in this process
+    from hugchat import hugchat
+
     chatbot = hugchat.ChatBot(cookie_path="engine\cookies.json")
     id = chatbot.new_conversation()
     chatbot.change_conversation(id)
@@ -0,0 +1,144 @@
+import queue
+import threading
+import time
+import wave
+
+
+# ********************************** detectors **********************************
+class PorcupineDetector(object):
+    def __init__(self, keywords=("bob", "alexa")):
+        import pvporcupine
+
+        # pre trained keywords
+        self.keywords = list(keywords)
+        self.porcupine = pvporcupine.create(keywords=self.keywords)
+        self.frame_length = self.porcupine.frame_length
+        self.sample_rate = self.porcupine.sample_rate
+
+    def process(self, pcm):
+        return self.porcupine.process(pcm)
+
+    def delete(self):
+        self.porcupine.delete()
+
+
+# ********************************** audio sources **********************************
+# A source calls on_frame(pcm) with one int16 view of frame_length samples per frame.
+class MicrophoneSource(object):
+    def __init__(self):
+        self.paud = None
+        self.stream = None
+
+    def start(self, frame_length, sample_rate, on_frame):
+        import pyaudio
+
+        def callback(in_data, frame_count, time_info, status):
+            # memoryview cast is a zero-copy int16 view over the bytes pyaudio hands us
+            on_frame(memoryview(in_data).cast("h"))
+            return (None, pyaudio.paContinue)
+
+        self.paud = pyaudio.PyAudio()
+        self.stream = self.paud.open(rate=sample_rate, channels=1, format=pyaudio.paInt16, input=True,
+                                     frames_per_buffer=frame_length, stream_callback=callback)
+        self.stream.start_stream()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.paud is not None:
+            self.paud.terminate()
+            self.paud = None
+
+
+class WavSource(object):
+    # mono 16-bit wav at the detector sample rate, used by tests and benchmarks
+    def __init__(self, path, realtime=False):
+        self.path = path
+        self.realtime = realtime
+        self.thread = None
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+
+    def start(self, frame_length, sample_rate, on_frame):
+        def run():
+            # one preallocated buffer is refilled for every frame
+            buffer = bytearray(frame_length * 2)
+            view = memoryview(buffer).cast("h")
+            try:
+                with wave.open(self.path, "rb") as wav:
+                    if wav.getnchannels() != 1 or wav.getsampwidth() != 2 or wav.getframerate() != sample_rate:
+                        raise ValueError(f"{self.path} must be mono 16-bit audio at {sample_rate} Hz")
+                    while not self.stopped.is_set():
+                        data = wav.readframes(frame_length)
+                        if len(data) < len(buffer):
+                            break
+                        buffer[:] = data
+                        on_frame(view)
+                        if self.realtime:
+                            time.sleep(frame_length / sample_rate)
+            finally:
+                self.finished.set()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+# ********************************** hotword listener **********************************
+class HotwordListener(object):
+    def __init__(self, detector, source, events=None):
+        self.detector = detector
+        self.source = source
+        # multiprocessing queue (or pipe connection) read by the jarvis process
+        self.events = events
+        self.frames = 0
+        self.detections = 0
+        self.cpu_started = None
+        self.wall_started = None
+
+    def on_frame(self, pcm):
+        self.frames += 1
+        keyword_index = self.detector.process(pcm)
+
+        # checking first keyword detetcted for not
+        if keyword_index >= 0:
+            self.detections += 1
+            print("hotword detected")
+            event = {"keyword": self.detector.keywords[keyword_index], "time": time.time()}
+            if self.events is None:
+                return
+            if hasattr(self.events, "send"):
+                self.events.send(event)
+            else:
+                try:
+                    self.events.put_nowait(event)
+                except queue.Full:
+                    pass
+
+    def start(self):
+        self.cpu_started = time.process_time()
+        self.wall_started = time.perf_counter()
+        self.source.start(self.detector.frame_length, self.detector.sample_rate, self.on_frame)
+
+    def stop(self):
+        self.source.stop()
+        self.detector.delete()
+
+    def report(self):
+        # cpu seconds spent per minute of audio that went through the detector
+        audio_seconds = self.frames * self.detector.frame_length / self.detector.sample_rate
+        cpu_seconds = time.process_time() - self.cpu_started
+        return {
+            "frames": self.frames,
+            "detections": self.detections,
+            "audio_seconds": round(audio_seconds, 2),
+            "cpu_seconds": round(cpu_seconds, 3),
+            "cpu_seconds_per_minute": round(cpu_seconds * 60 / audio_seconds, 3) if audio_seconds else 0.0,
+            "wall_seconds": round(time.perf_counter() - self.wall_started, 2),
+        }
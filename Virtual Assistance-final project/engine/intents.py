@@ -0,0 +1,58 @@
+from engine import features
+from engine.command import speak, takecommand
+from engine.helper import extract_yt_term, remove_words
+from engine.router import router
+
+# words that are not part of an app or contact name, said after "open" or after the action
+OPEN_WORDS = ["the", "app", "application", "please", "jarvis", "now", "for", "me"]
+CONTACT_WORDS = ["to", "with", "please", "jarvis", "on", "whatsapp", "now"]
+
+
+def app_name(target):
+    return remove_words(target, OPEN_WORDS)
+
+
+def contact_name(target):
+    return remove_words(target, CONTACT_WORDS)
+
+
+# ********************************** command handlers **********************************
+@router.route("open", [r"\bopen\s+(?P<app>.+)"], keywords=["open"], slots={"app": app_name})
+def handle_open(intent):
+    features.openCommand(intent.slots["app"])
+
+
+@router.route("youtube", [r"\bplay\s+.+?\s+on\s+youtube\b", r"\bon\s+youtube\b"], keywords=["on youtube"], slots={"term": extract_yt_term})
+def handle_youtube(intent):
+    term = intent.slots["term"]
+    if not term:
+        # "on youtube" without "play <something>"
+        speak("What should I play on YouTube?")
+        return
+    features.PlayYoutube(term)
+
+
+@router.route("contact", [r"\b(?P<action>send message|phone call|video call)\b(?P<name>.*)"], keywords=["send message", "phone call", "video call"], slots={"name": contact_name})
+def handle_contact(intent):
+    contact_no, name = features.findContact(intent.slots["name"])
+    if contact_no == 0:
+        return
+
+    action = intent.slots["action"]
+    message = intent.query
+    if action == "send message":
+        flag = 'message'
+        speak("what message to send")
+        message = takecommand()
+    elif action == "phone call":
+        flag = 'call'
+    else:
+        flag = 'video call'
+
+    features.whatsApp(contact_no, message, flag, name)
+
+
+@router.fallback("chat")
+def handle_chat(intent):
+    features.chatBot(intent.query)
+
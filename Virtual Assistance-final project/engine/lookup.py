@@ -0,0 +1,213 @@
+import bisect
+import csv
+import re
+import sqlite3
+import threading
+from collections import Counter
+from difflib import SequenceMatcher
+
+DB_PATH = "jarvis.db"
+
+_local = threading.local()
+
+
+# ********************************** connections **********************************
+def get_connection():
+    # sqlite connections must not be shared between eel threads, every thread gets its own
+    con = getattr(_local, "con", None)
+    if con is None:
+        con = sqlite3.connect(DB_PATH)
+        ensure_schema(con)
+        _local.con = con
+    return con
+
+
+def normalize(name):
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", str(name).lower()).split())
+
+
+def _columns(con, table):
+    return [row[1] for row in con.execute(f"PRAGMA table_info({table})")]
+
+
+def ensure_schema(con):
+    con.execute("CREATE TABLE IF NOT EXISTS sys_command(id integer primary key, name VARCHAR(100), path VARCHAR(1000))")
+    con.execute("CREATE TABLE IF NOT EXISTS web_command(id integer primary key, name VARCHAR(100), url VARCHAR(1000))")
+    con.execute("CREATE TABLE IF NOT EXISTS contacts (id integer primary key, name VARCHAR(200), mobile_no VARCHAR(255), email VARCHAR(255) NULL)")
+
+    # every write to a lookup table bumps its version so the in-memory indexes know to reload
+    con.execute("CREATE TABLE IF NOT EXISTS lookup_meta (name VARCHAR(100) primary key, version integer NOT NULL DEFAULT 0)")
+    for table in ("contacts", "sys_command", "web_command"):
+        if "name_norm" not in _columns(con, table):
+            con.execute(f"ALTER TABLE {table} ADD COLUMN name_norm VARCHAR(200)")
+        con.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_name_norm ON {table}(name_norm)")
+        con.execute("INSERT OR IGNORE INTO lookup_meta (name, version) VALUES (?, 0)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            con.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table}
+                            BEGIN UPDATE lookup_meta SET version = version + 1 WHERE name = '{table}'; END""")
+    con.commit()
+
+
+def _backfill(con, table):
+    # rows added by hand (sqlite browser, old db.py snippets) have no normalized name yet
+    rows = con.execute(f"SELECT id, name FROM {table} WHERE name_norm IS NULL").fetchall()
+    if rows:
+        con.executemany(f"UPDATE {table} SET name_norm = ? WHERE id = ?", [(normalize(name), row_id) for row_id, name in rows])
+        con.commit()
+
+
+def _version(con, table):
+    return con.execute("SELECT version FROM lookup_meta WHERE name = ?", (table,)).fetchone()[0]
+
+
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# ********************************** in-memory name index **********************************
+class NameIndex(object):
+    def __init__(self, table, value_column):
+        self.table = table
+        self.value_column = value_column
+        self.version = None
+        self.lock = threading.Lock()
+        self.exact = {}
+        self.names = []
+        self.tokens = []
+        self.token_names = {}
+        self.trigrams = {}
+
+    def refresh(self, con):
+        version = _version(con, self.table)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            _backfill(con, self.table)
+            version = _version(con, self.table)
+
+            exact = {}
+            for name, norm, value in con.execute(f"SELECT name, name_norm, {self.value_column} FROM {self.table} ORDER BY id"):
+                if norm and norm not in exact:
+                    exact[norm] = (name, value)
+
+            token_names = {}
+            trigrams = {}
+            for norm in exact:
+                for token in set(norm.split()):
+                    token_names.setdefault(token, []).append(norm)
+            for token in token_names:
+                for gram in _trigrams(token):
+                    trigrams.setdefault(gram, []).append(token)
+
+            # sorted full names and tokens give prefix search through bisect
+            self.exact = exact
+            self.names = sorted(exact)
+            self.tokens = sorted(token_names)
+            self.token_names = token_names
+            self.trigrams = trigrams
+            self.version = version
+
+    def _prefix(self, items, prefix, limit):
+        start = bisect.bisect_left(items, prefix)
+        found = []
+        for item in items[start:start + limit]:
+            if not item.startswith(prefix):
+                break
+            found.append(item)
+        return found
+
+    def _fuzzy(self, query, limit):
+        # candidate tokens share the most trigrams with a query word, their names are then
+        # ranked by how well every query word matches one of the name's words
+        words = query.split()
+        candidates = set()
+        for word in words:
+            counts = Counter()
+            for gram in _trigrams(word):
+                counts.update(self.trigrams.get(gram, ()))
+            for token, _ in counts.most_common(limit):
+                candidates.update(self.token_names[token][:limit])
+
+        scores = {}
+        for norm in candidates:
+            tokens = norm.split()
+            per_word = sum(max(SequenceMatcher(None, word, token).ratio() for token in tokens) for word in words) / len(words)
+            scores[norm] = max(per_word, SequenceMatcher(None, query, norm).ratio())
+        return scores
+
+    def search(self, query, limit=5, cutoff=0.7):
+        query = normalize(query)
+        if not query:
+            return []
+
+        if query in self.exact:
+            return [(1.0, query)]
+
+        ranked = {}
+        for norm in self._prefix(self.names, query, limit):
+            ranked[norm] = 0.95
+        for token in self._prefix(self.tokens, query, limit):
+            for norm in self.token_names[token][:limit]:
+                ranked.setdefault(norm, 0.9)
+
+        if not ranked:
+            for norm, score in self._fuzzy(query, limit).items():
+                if score >= cutoff:
+                    ranked[norm] = score * 0.85
+
+        # better score first, shorter (less specific) names win ties
+        return sorted(((score, norm) for norm, score in ranked.items()), key=lambda item: (-item[0], len(item[1])))[:limit]
+
+    def lookup(self, con, query):
+        self.refresh(con)
+        matches = self.search(query, limit=1)
+        if not matches:
+            return None
+        return self.exact[matches[0][1]]
+
+
+contacts_index = NameIndex("contacts", "mobile_no")
+apps_index = NameIndex("sys_command", "path")
+web_index = NameIndex("web_command", "url")
+
+
+def find_contact(query):
+    return contacts_index.lookup(get_connection(), query)
+
+
+def find_app(query):
+    return apps_index.lookup(get_connection(), query)
+
+
+def find_website(query):
+    return web_index.lookup(get_connection(), query)
+
+
+# ********************************** bulk import **********************************
+def import_contacts_csv(path, columns=(0, 30), batch_size=1000, skip_header=True):
+    # columns are the 0-based (name, mobile number) indices, defaults fit a google contacts export
+    con = get_connection()
+    name_index, mobile_index = columns
+    imported = 0
+    batch = []
+    with open(path, "r", encoding="utf-8") as csvfile:
+        csvreader = csv.reader(csvfile)
+        if skip_header:
+            next(csvreader, None)
+        with con:
+            for row in csvreader:
+                if len(row) <= max(name_index, mobile_index) or not row[name_index] or not row[mobile_index]:
+                    continue
+                name = row[name_index].strip()
+                batch.append((name, row[mobile_index].strip(), normalize(name)))
+                if len(batch) >= batch_size:
+                    con.executemany("INSERT INTO contacts (name, mobile_no, name_norm) VALUES (?, ?, ?)", batch)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                con.executemany("INSERT INTO contacts (name, mobile_no, name_norm) VALUES (?, ?, ?)", batch)
+                imported += len(batch)
+    return imported
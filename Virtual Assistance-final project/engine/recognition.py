@@ -0,0 +1,161 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import speech_recognition as sr
+
+
+# ********************************** recognizer backends **********************************
+# Every backend takes (recognizer, audio, language) and returns the recognized text.
+# Offline backends are only imported by speech_recognition when they are used.
+def _recognize_google(recognizer, audio, language):
+    return recognizer.recognize_google(audio, language=language)
+
+
+def _recognize_vosk(recognizer, audio, language):
+    # vosk expects a "model" folder next to run.py and answers with a json string
+    result = json.loads(recognizer.recognize_vosk(audio))
+    return result.get("text", "")
+
+
+def _recognize_whisper(recognizer, audio, language):
+    # local whisper model, it takes the bare language code ("en-in" -> "en")
+    return recognizer.recognize_whisper(audio, model=os.environ.get("JARVIS_WHISPER_MODEL", "base"),
+                                        language=language.split("-")[0])
+
+
+BACKENDS = {
+    "google": _recognize_google,
+    "vosk": _recognize_vosk,
+    "whisper": _recognize_whisper,
+}
+
+
+# ********************************** recognition pipeline **********************************
+class RecognitionPipeline(object):
+    def __init__(self, backend="google", language="en-in", recalibrate_after=300):
+        if backend not in BACKENDS:
+            raise ValueError("Unknown recognizer backend: " + backend)
+
+        self.backend = backend
+        self.language = language
+        self.recalibrate_after = recalibrate_after
+
+        # one recognizer for the whole session, it keeps the energy threshold between calls
+        self.recognizer = sr.Recognizer()
+        self.recognizer.pause_threshold = 1
+        self.calibrated_at = None
+
+        self.microphone = None
+        self.stop_listening = None
+        self.audio_queue = queue.Queue()
+        self.lock = threading.Lock()
+
+        # latency of the last run of every stage in milliseconds
+        self.timings = {}
+        self.counts = {}
+
+    def _record(self, stage, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        self.timings[stage] = round(elapsed, 2)
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        return elapsed
+
+    def calibrate(self, source):
+        started = time.perf_counter()
+        self.recognizer.adjust_for_ambient_noise(source)
+        self.calibrated_at = time.monotonic()
+        self._record("calibrate", started)
+
+    def recalibrate_if_due(self):
+        # ambient noise is measured again every recalibrate_after seconds, between two commands; the
+        # background listener owns the microphone and is paused meanwhile
+        with self.lock:
+            if self.stop_listening is None or time.monotonic() - self.calibrated_at < self.recalibrate_after:
+                return
+            self.stop_listening(wait_for_stop=True)
+            with self.microphone as source:
+                self.calibrate(source)
+            self.stop_listening = self.recognizer.listen_in_background(self.microphone, self._on_audio, phrase_time_limit=6)
+
+    def _on_audio(self, recognizer, audio):
+        # called from the background listener thread for every finished phrase
+        self.audio_queue.put((time.perf_counter(), audio))
+
+    def start(self):
+        with self.lock:
+            if self.stop_listening is not None:
+                return
+            self.microphone = sr.Microphone()
+            with self.microphone as source:
+                self.calibrate(source)
+            self.stop_listening = self.recognizer.listen_in_background(self.microphone, self._on_audio, phrase_time_limit=6)
+
+    def stop(self):
+        with self.lock:
+            if self.stop_listening is not None:
+                self.stop_listening(wait_for_stop=False)
+                self.stop_listening = None
+
+    def drain(self):
+        # drop phrases captured while nobody was waiting for a command
+        while True:
+            try:
+                self.audio_queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def listen(self, timeout=10):
+        self.start()
+        self.recalibrate_if_due()
+        self.drain()
+        started = time.perf_counter()
+        try:
+            captured_at, audio = self.audio_queue.get(timeout=timeout)
+        except queue.Empty:
+            self._record("listen", started)
+            return None
+        self._record("listen", started)
+        self.timings["queue_wait"] = round((time.perf_counter() - captured_at) * 1000, 2)
+        return audio
+
+    def recognize(self, audio):
+        started = time.perf_counter()
+        try:
+            text = BACKENDS[self.backend](self.recognizer, audio, self.language)
+        except (sr.UnknownValueError, sr.RequestError):
+            text = ""
+        self._record("recognize", started)
+        return text
+
+    def recognize_file(self, path):
+        # used by tests and benchmarks instead of the microphone
+        started = time.perf_counter()
+        with sr.AudioFile(path) as source:
+            audio = self.recognizer.record(source)
+        self._record("load", started)
+        return self.recognize(audio)
+
+    def take(self, timeout=10):
+        started = time.perf_counter()
+        audio = self.listen(timeout)
+        text = self.recognize(audio) if audio is not None else ""
+        self._record("total", started)
+        return text
+
+    def stats(self):
+        return {"backend": self.backend, "timings_ms": dict(self.timings), "counts": dict(self.counts)}
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = RecognitionPipeline(backend=os.environ.get("JARVIS_ASR_BACKEND", "google"))
+        return _pipeline
@@ -0,0 +1,175 @@
+import re
+import threading
+import time
+import traceback
+from difflib import SequenceMatcher
+
+
+# ********************************** parsed command **********************************
+class Intent(object):
+    def __init__(self, name, query, slots=None, score=1.0):
+        self.name = name
+        self.query = query
+        self.slots = slots or {}
+        self.score = score
+
+    def __repr__(self):
+        return f"Intent({self.name!r}, slots={self.slots!r}, score={self.score:.2f})"
+
+
+class Route(object):
+    def __init__(self, name, handler, patterns, keywords, slots):
+        self.name = name
+        self.handler = handler
+        self.patterns = patterns
+        self.keywords = keywords
+        # slot name -> function(text), text is the regex group of the same name when there is one,
+        # otherwise the whole query
+        self.slots = slots
+
+
+# ********************************** command router **********************************
+class Router(object):
+    def __init__(self, fuzzy_threshold=0.8):
+        self.routes = []
+        self.fallback_route = None
+        self.fuzzy_threshold = fuzzy_threshold
+        self.matcher = None
+        self.group_owner = {}
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def route(self, name, patterns, keywords=None, slots=None):
+        # routes are tried in the order they are registered, like the old if/elif chain
+        def decorator(handler):
+            self.routes.append(Route(name, handler, list(patterns), list(keywords or []), dict(slots or {})))
+            self.matcher = None
+            return handler
+        return decorator
+
+    def fallback(self, name):
+        def decorator(handler):
+            self.fallback_route = Route(name, handler, [], [], {})
+            return handler
+        return decorator
+
+    def compile(self):
+        # every pattern of every route becomes one alternative of a single anchored regex,
+        # slot groups are prefixed with the alternative index so names stay unique
+        alternatives = []
+        self.group_owner = {}
+        for route in self.routes:
+            for pattern in route.patterns:
+                tag = f"r{len(alternatives)}"
+                body = re.sub(r"\(\?P<(\w+)>", lambda m: f"(?P<{tag}__{m.group(1)}>", pattern)
+                alternatives.append(f"(?P<{tag}>.*?{body})")
+                self.group_owner[tag] = route
+        self.matcher = re.compile("^(?:" + "|".join(alternatives) + ")", re.IGNORECASE) if alternatives else None
+        return self.matcher
+
+    def _match(self, query):
+        if self.matcher is None:
+            self.compile()
+        if self.matcher is None:
+            return None
+        match = self.matcher.match(query)
+        if match is None:
+            return None
+
+        tag = match.lastgroup
+        route = self.group_owner[tag]
+        prefix = tag + "__"
+        slots = {}
+        for group, value in match.groupdict().items():
+            if group.startswith(prefix) and value is not None:
+                slots[group[len(prefix):]] = value.strip()
+        for slot, extract in route.slots.items():
+            slots[slot] = extract(slots.get(slot, query))
+        return Intent(route.name, query, slots)
+
+    def _fuzzy_rewrite(self, query):
+        # asr tends to split or bend keywords ("on you tube", "send massage"),
+        # find the closest keyword window and put the canonical keyword back
+        words = query.split()
+        best = (0.0, None, None, None)
+        matcher = SequenceMatcher()
+        for route in self.routes:
+            for keyword in route.keywords:
+                # the keyword side is cached by SequenceMatcher between windows
+                matcher.set_seq2(keyword)
+                size = len(keyword.split())
+                for width in range(max(1, size - 1), size + 2):
+                    for start in range(0, len(words) - width + 1):
+                        matcher.set_seq1(" ".join(words[start:start + width]))
+                        if matcher.real_quick_ratio() < self.fuzzy_threshold or matcher.quick_ratio() < self.fuzzy_threshold:
+                            continue
+                        score = matcher.ratio()
+                        if score > best[0]:
+                            best = (score, keyword, start, width)
+
+        score, keyword, start, width = best
+        if score < self.fuzzy_threshold:
+            return None, score
+        return " ".join(words[:start] + [keyword] + words[start + width:]), score
+
+    def parse(self, query):
+        query = " ".join(str(query).lower().split())
+
+        intent = self._match(query)
+        if intent is not None:
+            return intent
+
+        rewritten, score = self._fuzzy_rewrite(query)
+        if rewritten is not None:
+            intent = self._match(rewritten)
+            if intent is not None:
+                intent.score = score
+                return intent
+
+        if self.fallback_route is not None:
+            return Intent(self.fallback_route.name, query, score=0.0)
+        return None
+
+    def _find(self, name):
+        if self.fallback_route is not None and self.fallback_route.name == name:
+            return self.fallback_route
+        for route in self.routes:
+            if route.name == name:
+                return route
+        return None
+
+    def _record(self, name, elapsed, failed):
+        with self.lock:
+            entry = self.stats.setdefault(name, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["errors"] += int(failed)
+            entry["total_ms"] += elapsed
+            entry["max_ms"] = max(entry["max_ms"], elapsed)
+
+    def dispatch(self, query):
+        intent = self.parse(query)
+        if intent is None:
+            return None
+
+        route = self._find(intent.name)
+        started = time.perf_counter()
+        failed = False
+        try:
+            route.handler(intent)
+        except Exception:
+            failed = True
+            print(f"error in {intent.name} handler")
+            traceback.print_exc()
+        finally:
+            self._record(intent.name, (time.perf_counter() - started) * 1000, failed)
+        return intent
+
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for name, entry in self.stats.items():
+                result[name] = dict(entry, avg_ms=round(entry["total_ms"] / entry["calls"], 2) if entry["calls"] else 0.0)
+            return result
+
+
+router = Router()
@@ -0,0 +1,196 @@
+import multiprocessing
+import queue
+import signal
+import time
+import uuid
+
+# hotword: detections for the ui, status: ready/heartbeat/latency/restart messages for the ui,
+# the other channels are request queues of a worker and the reply queue the ui waits on
+CHANNELS = ["hotword", "status", "asr", "asr_reply", "tts", "tts_reply", "chat", "chat_reply"]
+STOP = "stop"
+
+
+# ********************************** event bus **********************************
+class EventBus(object):
+    def __init__(self):
+        self.started = time.time()
+        self.queues = {name: multiprocessing.Queue() for name in CHANNELS}
+        # replies taken off a reply queue by this process, until the request waiting for them picks them up
+        self.replies = {}
+
+    def put(self, channel, message):
+        self.queues[channel].put(message)
+
+    def get(self, channel, timeout=None):
+        try:
+            if timeout == 0:
+                return self.queues[channel].get_nowait()
+            return self.queues[channel].get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def status(self, worker, event, **data):
+        data.update(worker=worker, event=event, time=time.time())
+        self.put("status", data)
+
+    def request(self, channel, payload, timeout=30, sleep=time.sleep):
+        # sleep is eel.sleep in the ui process so waiting does not block other greenlets
+        request_id = uuid.uuid4().hex
+        self.replies[request_id] = None
+        self.put(channel, (request_id, payload))
+        deadline = time.time() + timeout
+        try:
+            while time.time() < deadline:
+                self._collect(channel)
+                reply = self.replies.get(request_id)
+                if reply is None:
+                    sleep(0.02)
+                    continue
+                result, error = reply
+                if error is not None:
+                    raise RuntimeError(f"{channel} worker failed: {error}")
+                return result
+            raise TimeoutError(f"{channel} worker did not answer in {timeout} s")
+        finally:
+            self.replies.pop(request_id, None)
+
+    def _collect(self, channel):
+        # whichever waiter polls the reply queue files every reply under the request id it answers
+        while True:
+            reply = self.get(channel + "_reply", timeout=0)
+            if reply is None:
+                return
+            reply_id, result, error = reply
+            # replies to requests that already timed out have nobody waiting for them
+            if reply_id in self.replies:
+                self.replies[reply_id] = (result, error)
+
+
+def serve(bus, name, channel, handle):
+    # request loop shared by the asr, tts and chat workers
+    bus.status(name, "ready")
+    while True:
+        message = bus.get(channel, timeout=5)
+        if message is None:
+            bus.status(name, "heartbeat")
+            continue
+        if message == STOP:
+            break
+
+        request_id, payload = message
+        started = time.perf_counter()
+        result, error = None, None
+        try:
+            result = handle(payload)
+        except Exception as e:
+            error = str(e)
+        bus.put(channel + "_reply", (request_id, result, error))
+        bus.status(name, "latency", ms=round((time.perf_counter() - started) * 1000, 2), error=error)
+
+
+# ********************************** health board **********************************
+class HealthBoard(object):
+    def __init__(self, started):
+        self.started = started
+        self.workers = {}
+
+    def update(self, message):
+        worker = self.workers.setdefault(message["worker"], {"state": "starting", "restarts": 0, "requests": 0, "errors": 0})
+        event = message["event"]
+        worker["last_seen"] = message["time"]
+        if event == "ready":
+            worker["state"] = "ready"
+            # time from supervisor start to the first ready message, restarts do not reset it
+            worker.setdefault("startup_ms", round((message["time"] - self.started) * 1000))
+        elif event == "latency":
+            worker["requests"] += 1
+            worker["errors"] += int(message.get("error") is not None)
+            worker["last_ms"] = message["ms"]
+            worker["max_ms"] = max(worker.get("max_ms", 0), message["ms"])
+        elif event == "restart":
+            worker["state"] = "restarting"
+            worker["restarts"] += 1
+            worker["exitcode"] = message.get("exitcode")
+        elif event == "response":
+            # hotword detected -> command handled, measured in the ui process
+            worker["last_response_ms"] = message["ms"]
+
+    def snapshot(self):
+        now = time.time()
+        result = {}
+        for name, worker in self.workers.items():
+            result[name] = dict(worker, idle_s=round(now - worker["last_seen"], 1))
+        return result
+
+
+# ********************************** supervisor **********************************
+class Worker(object):
+    def __init__(self, name, target, args=(), channel=None):
+        self.name = name
+        self.target = target
+        self.args = args
+        # request channel that gets the stop message on shutdown
+        self.channel = channel
+        self.process = None
+        self.restarts = 0
+        self.restart_at = None
+
+
+class Supervisor(object):
+    def __init__(self, bus, max_backoff=30):
+        self.bus = bus
+        self.max_backoff = max_backoff
+        self.workers = []
+        self.stopping = False
+
+    def add(self, name, target, args=(), channel=None):
+        self.workers.append(Worker(name, target, (self.bus,) + tuple(args), channel))
+
+    def _spawn(self, worker):
+        worker.process = multiprocessing.Process(target=worker.target, args=worker.args, name=worker.name, daemon=True)
+        worker.process.start()
+
+    def _stop(self, signum=None, frame=None):
+        self.stopping = True
+
+    def run(self, ui="ui"):
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+
+        for worker in self.workers:
+            self._spawn(worker)
+
+        while not self.stopping:
+            time.sleep(0.5)
+            for worker in self.workers:
+                if worker.process.is_alive():
+                    continue
+
+                # closing the ui window ends the whole assistant, like run.py always did
+                if worker.name == ui and worker.process.exitcode == 0:
+                    self.stopping = True
+                    break
+
+                if worker.restart_at is None:
+                    worker.restarts += 1
+                    worker.restart_at = time.time() + min(self.max_backoff, 2 ** (worker.restarts - 1))
+                    print(f"{worker.name} exited with {worker.process.exitcode}, restarting")
+                    self.bus.status(worker.name, "restart", exitcode=worker.process.exitcode)
+                elif time.time() >= worker.restart_at:
+                    worker.restart_at = None
+                    self._spawn(worker)
+
+        self.shutdown()
+
+    def shutdown(self, timeout=5):
+        for worker in self.workers:
+            if worker.channel is not None:
+                self.bus.put(worker.channel, STOP)
+
+        deadline = time.time() + timeout
+        for worker in self.workers:
+            worker.process.join(max(0, deadline - time.time()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        print("system stop")
@@ -0,0 +1,71 @@
+import itertools
+import time
+
+from engine.supervisor import serve
+
+# Every worker only imports what it needs, so a crash or restart of one of them
+# does not pay for the whole engine again.
+
+
+def uiWorker(bus):
+    from main import start
+    start(bus)
+
+
+def hotwordWorker(bus, wav_path=None):
+    from engine.hotword import HotwordListener, MicrophoneSource, PorcupineDetector, WavSource
+
+    # a scripted recording is played at real time so latencies look like the microphone
+    source = WavSource(wav_path, realtime=True) if wav_path else MicrophoneSource()
+    listener = HotwordListener(PorcupineDetector(keywords=["bob", "alexa"]), source, bus.queues["hotword"])
+    listener.start()
+    bus.status("hotword", "ready")
+    try:
+        while True:
+            time.sleep(5)
+            bus.status("hotword", "heartbeat", **listener.report())
+    finally:
+        listener.stop()
+
+
+def asrWorker(bus, wav_paths=None):
+    from engine.recognition import get_pipeline
+
+    pipeline = get_pipeline()
+    scripted = itertools.cycle(wav_paths) if wav_paths else None
+
+    def handle(payload):
+        if scripted is not None:
+            return pipeline.recognize_file(next(scripted)).lower()
+        return pipeline.take(timeout=payload.get("timeout", 10)).lower()
+
+    serve(bus, "asr", "asr", handle)
+
+
+def ttsWorker(bus):
+    import pyttsx3
+
+    # one engine for the whole session instead of pyttsx3.init() on every sentence
+    engine = pyttsx3.init('sapi5')
+    voices = engine.getProperty('voices')
+    engine.setProperty('voice', voices[0].id)
+    engine.setProperty('rate', 174)
+
+    def handle(text):
+        engine.say(text)
+        engine.runAndWait()
+
+    serve(bus, "tts", "tts", handle)
+
+
+def chatWorker(bus):
+    from hugchat import hugchat
+
+    chatbot = hugchat.ChatBot(cookie_path="engine\\cookies.json")
+
+    def handle(query):
+        id = chatbot.new_conversation()
+        chatbot.change_conversation(id)
+        return str(chatbot.chat(query))
+
+    serve(bus, "chat", "chat", handle)
@@ -1,15 +1,60 @@
 import os
+import time
 import webbrowser
 import eel
 
 from engine.features import *
 from engine.command import *
+from engine.intents import router
+from engine.supervisor import HealthBoard
 
-def start():
+health = None
+
+
+def watchHotword(bus):
+    # detections come from the hotword worker, eel greenlets must not block on the queue
+    while True:
+        event = bus.get("hotword", timeout=0)
+        if event is None:
+            eel.sleep(0.05)
+            continue
+        print(f"hotword {event['keyword']} after {(time.time() - event['time']) * 1000:.0f} ms")
+        markHotword(event)
+        eel.HotwordDetected()
+
+
+def watchStatus(bus):
+    while True:
+        message = bus.get("status", timeout=0)
+        if message is None:
+            eel.sleep(0.2)
+            continue
+        health.update(message)
+
+
+@eel.expose
+def systemStatus():
+    return {"workers": health.snapshot() if health else {}, "router": router.snapshot()}
+
+
+def start(bus=None):
+    global health
     
     eel.init("www")
 
+    # routes are registered by engine.intents, build the matcher before the first command
+    router.compile()
+
+    if bus is not None:
+        health = HealthBoard(bus.started)
+        attachBus(bus)
+        eel.spawn(watchHotword, bus)
+        eel.spawn(watchStatus, bus)
+
     # Open the app in the default web browser
     webbrowser.open("http://localhost:8000/index.html")
 
+    if bus is not None:
+        bus.status("ui", "ready")
+
     eel.start('index.html', mode=None, host='localhost', block=True)
@@ -1,33 +1,26 @@
- 
-
+import argparse
 import multiprocessing
-import subprocess
-
-# To run Jarvis
-def startJarvis():
-        # Code for process 1
-        print("Process 1 is running.")
-        from main import start
-        start()
 
-# To run hotword
-def listenHotword():
-        # Code for process 2
-        print("Process 2 is running.")
-        from engine.features import hotword
-        hotword()
+from engine.supervisor import EventBus, Supervisor
+from engine.workers import asrWorker, chatWorker, hotwordWorker, ttsWorker, uiWorker
 
 
-    # Start both processes
+# Start the supervisor, it restarts crashed workers and stops all of them when the ui closes
 if __name__ == '__main__':
-        p1 = multiprocessing.Process(target=startJarvis)
-        p2 = multiprocessing.Process(target=listenHotword)
-        p1.start()
-        p2.start()
-        p1.join()
+        multiprocessing.freeze_support()
 
-        if p2.is_alive():
-            p2.terminate()
-            p2.join()
+        # scripted audio replaces the microphone to measure startup and hotword-to-response latency:
+        # python run.py --hotword-wav bob.wav --command-wav open_chrome.wav
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--hotword-wav", help="mono 16-bit 16 kHz recording that drives the hotword worker")
+        parser.add_argument("--command-wav", action="append", help="recording answered by the asr worker, can be repeated")
+        args = parser.parse_args()
 
-        print("system stop")
\ No newline at end of file
+        bus = EventBus()
+        supervisor = Supervisor(bus)
+        supervisor.add("ui", uiWorker)
+        supervisor.add("hotword", hotwordWorker, (args.hotword_wav,))
+        supervisor.add("asr", asrWorker, (args.command_wav,), channel="asr")
+        supervisor.add("tts", ttsWorker, channel="tts")
+        supervisor.add("chat", chatWorker, channel="chat")
+        supervisor.run()
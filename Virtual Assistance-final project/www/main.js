@@ -46,14 +46,20 @@ $(document).ready(function () {
         // this would test for whichever key is 40 (down arrow) and the ctrl key at the same time
 
         if (e.key === 'b' && e.metaKey) {
-            eel.playAssistantSound()
-            $("#Oval").attr("hidden", true);
-            $("#SiriWave").attr("hidden", false);
-            eel.allCommands()()
+            HotwordDetected()
         }
     }
     document.addEventListener('keyup', doc_keyUp, false);
 
+    // hotword detected by the listener process
+    eel.expose(HotwordDetected)
+    function HotwordDetected() {
+        eel.playAssistantSound()
+        $("#Oval").attr("hidden", true);
+        $("#SiriWave").attr("hidden", false);
+        eel.allCommands()()
+    }
+
     // to play assisatnt 
     function PlayAssistant(message) {
 